@@ -4,6 +4,15 @@ import arcpy.sa
 import arcpy.da
 import math
 import datetime
+import os.path
+import json
+import tempfile
+import numpy
+import sys
+import shutil
+import multiprocessing.pool
+sys.path.append(os.path.split(__file__)[0])
+import codetool.cache as ct_cache
 
 from random import seed as randomize
 from random import random as get_random
@@ -20,13 +29,26 @@ def __field_type(dataset,field):
 def __geo_type(dataset):
 	return arcpy.Describe(dataset).shapeType
 
+#py2中str字段名按utf8解码，unicode原样返回
+def __unicode_arg(text):
+	try:
+		return text.decode("utf8")
+	except:
+		return text
+
+#新旧值是否不同，NaN视为相同
+def __value_changed(old_value,new_value):
+	if old_value!=old_value and new_value!=new_value:
+		return False
+	return old_value!=new_value
+
 #utf8_field这个参数名称有点问题
-def FieldStringReplace(dataset,field_name,old_pattern,new_pattern,utf8_field=True):
-	cursor=arcpy.UpdateCursor(dataset)
-	old_pattern=old_pattern.decode("utf8")
-	new_pattern=new_pattern.decode("utf8")
-	for row in cursor:
-		str=row.getValue(field_name.decode("utf8"))
+def FieldStringReplace(dataset,field_name,old_pattern,new_pattern,utf8_field=True,mode="MEMO"):
+	old_pattern=__unicode_arg(old_pattern)
+	new_pattern=__unicode_arg(new_pattern)
+	def rule(str):
+		if str==None:
+			return str
 		if not utf8_field:
 			str=str.encode("utf8")
 		str2=str.replace(old_pattern,new_pattern)
@@ -34,9 +56,8 @@ def FieldStringReplace(dataset,field_name,old_pattern,new_pattern,utf8_field=Tru
 			str2=str2.decode("utf8")
 		if str!=str2:
 			print(str+'  ->  '+str2)
-		row.setValue(field_name.decode("utf8"),str2)
-		cursor.updateRow(row)
-	del row,cursor
+		return str2
+	return FieldUpdater(dataset,field_name,rule,mode)
 	
 	
 # TEXT —名称或其他文本特性。 
@@ -50,99 +71,348 @@ def FieldStringReplace(dataset,field_name,old_pattern,new_pattern,utf8_field=Tru
 # GUID —GUID 值 
 
 	
-def FieldUpdater(dataset,field_name,rule=lambda x:x):
-	cursor=arcpy.UpdateCursor(dataset)
+#按rule更新字段值，只写回值发生变化的行，返回变化的行数
+#mode="ROW"时rule逐行调用；"MEMO"时相同的值只调用一次rule，适合取值较少的字段；
+#"VECTOR"时rule以整列numpy数组为参数并返回等长数组，数值字段的空值以NaN表示，写回时NaN转为空值
+#FieldUpdater("地块","面积",lambda x:x/10000.0,"VECTOR")
+def FieldUpdater(dataset,field_name,rule=lambda x:x,mode="ROW"):
+	field_name=__unicode_arg(field_name)
+	mode=mode.upper()
+	if not mode in ["ROW","MEMO","VECTOR"]:
+		raise Exception("无效的更新模式："+mode)
+	changed=0
+	if mode=="VECTOR":
+		values=[row[0] for row in arcpy.da.SearchCursor(dataset,[field_name])]
+		if None in values and __field_type(dataset,field_name) in ["SmallInteger","Integer","Single","Double"]:
+			column=numpy.array([numpy.nan if x==None else x for x in values],dtype=numpy.float64)
+		elif None in values:
+			column=numpy.array(values,dtype=object)
+		else:
+			column=numpy.array(values)
+		new_values=numpy.asarray(rule(column))
+		if new_values.shape!=column.shape:
+			raise Exception("rule返回的数组长度与字段行数不一致")
+		new_values=[None if x!=x else x for x in new_values.tolist()]
+		updates=[__value_changed(values[i],new_values[i]) for i in range(len(values))]
+		if not True in updates:
+			return 0
+		cursor=arcpy.da.UpdateCursor(dataset,[field_name])
+		idx=0
+		for row in cursor:
+			if updates[idx]:
+				cursor.updateRow([new_values[idx]])
+				changed+=1
+			idx+=1
+		del cursor
+		return changed
+	memo={}
+	cursor=arcpy.da.UpdateCursor(dataset,[field_name])
 	for row in cursor:
-		value=row.getValue(field_name.decode("utf8"))
-		new_value=rule(value)
-		row.setValue(field_name.decode("utf8"),new_value)
-		cursor.updateRow(row)
-	del row,cursor
-	
-def FieldTypeChanger(dataset, field_name, field_type, field_scale_or_length=0, field_precision=0, change_field_name=None, new_alias=None, delete_bak_field=False):
-	'''临时字段最大长度为255，请注意可能存在截断丢失信息的情况。'''
-	bak_field_name = (("bak_"+field_name.encode("utf8"))[:10]).decode("utf8") # 为了兼容Shapefile字段限制，全部截断到10字符
-	bak_field_size = 255 # 如果字段值更大还会丢失，还可以再加判断
-	func_name_options = \
-		{\
-		"TEXT":str,\
-		"FLOAT":float,\
-		"DOUBLE":float,\
-		"SHORT":lambda x:int(float(x)),\
-		"LONG":lambda x:int(float(x)),\
-		"DATE":lambda x:datetime.datetime.strptime(x,"%Y-%m-%d %H:%M:%S"),\
-		"BLOB":lambda x:x,\
-		"RASTER":lambda x:x,\
-		"GUID":lambda x:x\
-		}
-	if field_type.upper() not in func_name_options:
-		arcpy.AddError(u"无效的字段类型："%(field_type,))
-		raise Exception(u"无效的字段类型："%(field_type,))
+		value=row[0]
+		if mode=="MEMO":
+			if not value in memo:
+				memo[value]=rule(value)
+			new_value=memo[value]
+		else:
+			new_value=rule(value)
+		if __value_changed(value,new_value):
+			cursor.updateRow([new_value])
+			changed+=1
+	del cursor
+	return changed
 	
-	try:
-		#始终创建文本字段，最大可能保留信息
-		arcpy.management.AddField(dataset, bak_field_name, "TEXT", bak_field_size)
-	except:
-		arcpy.AddError(u"未能成功创建临时字段，字段修改失败。")
-		raise Exception(u"未能成功创建临时字段，字段修改失败。")
+__ADD_FIELD_TYPES = {"OID":"LONG","Integer":"LONG","SmallInteger":"SHORT","Double":"DOUBLE","Single":"FLOAT","String":"TEXT","Date":"DATE","Guid":"GUID","GUID":"GUID","Blob":"BLOB","Raster":"RASTER"}
+__INTEGER_RANGES = {"SHORT":(-32768,32767),"LONG":(-2147483648,2147483647)}
+
+#按字段定义添加字段，field为arcpy.Field对象
+def __add_field_like(dataset,field_name,field):
+	field_type = __ADD_FIELD_TYPES[field.type]
+	if field_type=="TEXT":
+		arcpy.management.AddField(dataset,field_name,field_type,field_length=field.length,field_alias=field.aliasName)
+	else:
+		arcpy.management.AddField(dataset,field_name,field_type,field_precision=field.precision,field_scale=field.scale,field_alias=field.aliasName)
+
+__CHUNK_SIZE = 100000
+
+#count行的定长数组，行数超过memmap_threshold时存放在临时文件中；对象数组始终在内存中
+def __new_buffer(count,dtype,memmap_threshold):
+	if dtype!=object and count>memmap_threshold:
+		return numpy.memmap(tempfile.TemporaryFile(),dtype=dtype,mode="w+",shape=(max(count,1),))[:count]
+	return numpy.zeros(count,dtype=dtype)
+
+#一次读取字段值，返回(值数组,空值掩码)；整型字段缓存为int64，浮点字段为float64，其他字段为对象数组
+def __buffer_field(dataset,field_name,source_type,memmap_threshold):
+	count = int(arcpy.management.GetCount(dataset)[0])
+	if source_type in ["SmallInteger","Integer"]:
+		dtype = numpy.int64
+	elif source_type in ["Single","Double"]:
+		dtype = numpy.float64
+	else:
+		dtype = object
+	values = __new_buffer(count,dtype,memmap_threshold)
+	nulls = __new_buffer(count,bool,memmap_threshold)
+	idx = 0
+	for row in arcpy.da.SearchCursor(dataset,[field_name]):
+		if row[0]==None:
+			nulls[idx] = True
+		else:
+			values[idx] = row[0]
+		idx += 1
+	return values[:idx],nulls[:idx]
+
+#缓存数组第i行的Python值
+def __buffer_value(values,nulls,i):
+	if nulls[i]:
+		return None
+	if values.dtype==object:
+		return values[i]
+	return values[i].item()
+
+def __to_text(x):
+	return repr(x) if type(x)==float else u"%s"%(x,)
+
+def __to_date(x):
+	if type(x)==datetime.datetime:
+		return x
+	return datetime.datetime.strptime(x,"%Y-%m-%d %H:%M:%S")
+
+#在rows行中找出第一个无法转换的值并报错
+def __conversion_failed(values,rows,converter,message):
+	for i in rows.tolist():
+		try:
+			converter(values[i])
+		except:
+			raise Exception(u"第%d行的值%s：%s"%(i,message,values[i]))
+	raise Exception(u"字段值"+message)
+
+#分块检查并转换缓存的字段值，有无法转换的值时报错，此时尚未修改表结构；field_length<=0时不检查文本长度
+#数值类型向量化转换为定长数组(行数超过memmap_threshold时存放在临时文件中)，其他类型只做检查，写回时逐行转换
+#返回(转换后的数值数组或None,逐行转换函数,最长文本长度)
+def __convert_column(values,nulls,field_type,field_length,memmap_threshold):
+	count = len(values)
+	converted = None
+	converter = lambda x:x
+	if field_type in __INTEGER_RANGES:
+		converted = __new_buffer(count,numpy.int64,memmap_threshold)
+	elif field_type in ["FLOAT","DOUBLE"]:
+		converted = __new_buffer(count,numpy.float64,memmap_threshold)
+	elif field_type=="TEXT":
+		converter = __to_text
+	elif field_type=="DATE":
+		converter = __to_date
+	longest = 0
+	for start in range(0,count,__CHUNK_SIZE):
+		rows = numpy.nonzero(~nulls[start:start+__CHUNK_SIZE])[0]+start
+		if converted is not None:
+			if values.dtype==object:
+				try:
+					numbers = numpy.asarray(values[rows].tolist(),dtype=numpy.float64).reshape(-1)
+				except:
+					__conversion_failed(values,rows,float,u"无法转换为数值")
+			else:
+				numbers = values[rows].astype(numpy.float64)
+			if field_type in __INTEGER_RANGES:
+				low,high = __INTEGER_RANGES[field_type]
+				numbers = numpy.trunc(numbers)
+				outside = ~((numbers>=low)&(numbers<=high))
+				if outside.any():
+					i = rows[numpy.nonzero(outside)[0][0]]
+					raise Exception(u"第%d行的值超出%s字段范围：%s"%(i,field_type,values[i]))
+			converted[rows] = numbers
+		elif field_type=="TEXT":
+			lengths = numpy.array([len(__to_text(x)) for x in values[rows].tolist()],dtype=numpy.int64)
+			if len(lengths)>0 and lengths.max()>longest:
+				longest = int(lengths.max())
+				if field_length>0 and longest>field_length:
+					i = rows[numpy.argmax(lengths)]
+					raise Exception(u"第%d行的值长度为%d，超过TEXT字段长度%d"%(i,longest,field_length))
+		elif field_type=="DATE":
+			try:
+				[__to_date(x) for x in values[rows].tolist()]
+			except:
+				__conversion_failed(values,rows,__to_date,u"不是%Y-%m-%d %H:%M:%S格式的日期")
+	return converted,converter,longest
+
+#一次读取字段值并分块完成类型转换检查，全部可以转换后才删除并重建字段，再一次写回
+#TEXT字段长度为0时按最长的值确定(不小于255)，值超过字段长度时报错而不截断
+#重建或写回失败时删除本次创建的字段并恢复原字段定义和原值；delete_bak_field为False时另存与原字段同类型的备份字段
+#change_field_name或备份字段已经存在时报错，不会覆盖
+#行数超过memmap_threshold时数值字段的原值和转换结果缓存在临时文件中
+def FieldTypeChanger(dataset, field_name, field_type, field_scale_or_length=0, field_precision=0, change_field_name=None, new_alias=None, delete_bak_field=False, memmap_threshold=5000000):
+	field_type = field_type.upper()
+	if field_type not in ["TEXT","FLOAT","DOUBLE","SHORT","LONG","DATE","BLOB","RASTER","GUID"]:
+		arcpy.AddError(u"无效的字段类型：%s"%(field_type,))
+		raise Exception(u"无效的字段类型：%s"%(field_type,))
+	field_name = __unicode_arg(field_name)
+	fields = [x for x in arcpy.ListFields(dataset) if x.name==field_name]
+	if len(fields)==0:
+		arcpy.AddError(u"字段不存在：%s"%(field_name,))
+		raise Exception(u"字段不存在：%s"%(field_name,))
+	field = fields[0]
 	
-	cursor = arcpy.da.UpdateCursor(dataset, [field_name, bak_field_name])
-	for row in cursor:
-		row[1] = str(row[0])
-		cursor.updateRow(row)
-	del cursor
+	new_field_name = field_name if not change_field_name else __unicode_arg(change_field_name)
+	bak_field_name = None
+	if not delete_bak_field:
+		bak_field_name = (("bak_"+field_name.encode("utf8"))[:10]).decode("utf8") # 为了兼容Shapefile字段限制，全部截断到10字符
+	existing = [x.name.lower() for x in arcpy.ListFields(dataset)]
+	for name in [new_field_name, bak_field_name]:
+		if name!=None and name!=field_name and name.lower() in existing:
+			arcpy.AddError(u"字段已存在：%s"%(name,))
+			raise Exception(u"字段已存在：%s"%(name,))
 	
-	arcpy.management.DeleteField(dataset, field_name)
+	values,nulls = __buffer_field(dataset,field_name,field.type,memmap_threshold)
+	try:
+		converted,converter,longest = __convert_column(values,nulls,field_type,field_scale_or_length,memmap_threshold)
+	except Exception as info:
+		arcpy.AddError(u"字段值转换失败，字段未修改。")
+		raise info
+	if field_type=="TEXT" and field_scale_or_length<=0:
+		field_scale_or_length = max(longest,255)
 	
-	new_field_name = field_name if change_field_name==None else change_field_name
+	created = []
+	deleted = False
+	try:
+		if new_field_name==field_name:
+			arcpy.management.DeleteField(dataset, field_name)
+			deleted = True
+		if field_type in ["TEXT", "BLOB"]:
+			arcpy.management.AddField(dataset, new_field_name, field_type, field_length=field_scale_or_length, field_alias=new_alias)
+		else:
+			arcpy.management.AddField(dataset, new_field_name, field_type, field_precision=field_precision, field_scale=field_scale_or_length, field_alias=new_alias)
+		created.append(new_field_name)
+		write_fields = [new_field_name]
+		if bak_field_name!=None:
+			__add_field_like(dataset, bak_field_name, field)
+			created.append(bak_field_name)
+			write_fields.append(bak_field_name)
+		cursor = arcpy.da.UpdateCursor(dataset, write_fields)
+		idx = 0
+		for row in cursor:
+			if nulls[idx]:
+				new_value = None
+			elif converted is not None:
+				new_value = converted[idx].item()
+			else:
+				new_value = converter(__buffer_value(values,nulls,idx))
+			if bak_field_name!=None:
+				cursor.updateRow([new_value, __buffer_value(values,nulls,idx)])
+			else:
+				cursor.updateRow([new_value])
+			idx += 1
+		del cursor
+	except Exception as info:
+		#只删除本次创建的字段，再恢复原字段
+		for name in created:
+			arcpy.management.DeleteField(dataset, name)
+		if deleted:
+			__add_field_like(dataset, field_name, field)
+			cursor = arcpy.da.UpdateCursor(dataset, [field_name])
+			idx = 0
+			for row in cursor:
+				cursor.updateRow([__buffer_value(values,nulls,idx)])
+				idx += 1
+			del cursor
+		arcpy.AddError(u"字段修改失败，已恢复原字段：%s"%(info,))
+		raise info
+	if new_field_name!=field_name:
+		arcpy.management.DeleteField(dataset, field_name)
 	
-	# 这里创建的字段
-	if field_type in ["TEXT", "BLOB"]:
-		arcpy.management.AddField(dataset, new_field_name, field_type, field_length=field_scale_or_length, field_alias=new_alias)
-	else:
-		arcpy.management.AddField(dataset, new_field_name, field_type, field_precision=field_precision, field_scale=field_scale_or_length, field_alias=new_alias)
-	func_name = func_name_options[field_type.upper()]
-	cursor = arcpy.da.UpdateCursor(dataset, [bak_field_name, new_field_name])
-	for row in cursor:
-		row[1] = func_name(row[0])
-		cursor.updateRow(row)
-	del cursor
 	if len(arcpy.GetParameterInfo())==0:
 		import ctypes
 		ctypes.windll.user32.MessageBoxW(0, u"直接在python窗口调用FieldTypeChanger需要在表视图中重新打开修改的数据，否则不会触发更新。", u"表视图未更新", 0x40)
 	
-	if delete_bak_field:
-		arcpy.management.DeleteField(dataset, bak_field_name)
-	
 	
 	
+#将字段统一赋值为value，已经等于value的行不写回
 def FieldDefiner(dataset,field_name,value):
-	cursor=arcpy.UpdateCursor(dataset)
-	for row in cursor:
-		row.setValue(field_name.decode("utf8"),value)
-		cursor.updateRow(row)
-	del row,cursor
+	return FieldUpdater(dataset,field_name,lambda x:value)
 	
 	
-#判断iden_dataset(点数据)分别能够被纳入多少个region_dataset中的面域内。符合条件的FID结果记录在record_field中，以逗号隔开。
+#判断iden_dataset中各要素分别被region_dataset中哪些面域包含。符合条件的面ID结果记录在record_field中，以逗号隔开。
+#点要素用面的格网索引批量判断；线、面要素先按外接矩形筛选候选面，再对候选面逐一用contains判断
+#join_table不为None时另存多对多关联表，字段为feature_id(feature_id_field的值，默认为OID)和region_id(面ID)，可用ContainsDicter读取为哈希索引
+#record_field为None时只输出关联表
 #ContainsRecorder('待识别要素','文本字段','面要素','面ID')
-def ContainsRecorder(iden_dataset,record_field,region_dataset,idenitiy_field):
-	regions=[]
-	for row in arcpy.da.SearchCursor(region_dataset,[idenitiy_field,"SHAPE@"]):
-		regions.append(row)
-	del row
-	try:
-		cursor=arcpy.da.UpdateCursor(iden_dataset,["SHAPE@",record_field.decode("utf8")])
-	except:
-		cursor=arcpy.da.UpdateCursor(iden_dataset,["SHAPE@",record_field])
-	for row in cursor:
-		comma=','
-		for region in regions:
-			if region[1].contains(row[0]):
-				comma+=str(region[0])+','
-		row[1]=comma
-		cursor.updateRow(row)
-	del row,cursor
+#ContainsRecorder('待识别要素',None,'面要素','面ID',join_table='in_memory/iden_region')
+def ContainsRecorder(iden_dataset,record_field,region_dataset,idenitiy_field,join_table=None,feature_id_field=None,batch_size=200000):
+	sr = arcpy.Describe(iden_dataset).spatialReference
+	region_ids = []
+	polygons = []
+	for row in arcpy.da.SearchCursor(region_dataset,[idenitiy_field,"SHAPE@"],spatial_reference=sr):
+		region_ids.append(row[0])
+		polygons.append(row[1])
+	index = _PolygonIndex_(polygons)
+	
+	id_field = "OID@" if feature_id_field==None else feature_id_field
+	feature_ids = []
+	fea_idx = []
+	reg_idx = []
+	if __geo_type(iden_dataset) == "Point":
+		for start,xy,rows in __point_batches(iden_dataset,[id_field],sr,batch_size):
+			pt_idx,pg_idx = index.contains(xy)
+			fea_idx.append(pt_idx+start)
+			reg_idx.append(pg_idx)
+			feature_ids.extend([row[0] for row in rows])
+	else:
+		shapes = []
+		cursor = arcpy.da.SearchCursor(iden_dataset,["SHAPE@",id_field])
+		while True:
+			row = next(cursor,None)
+			if row!=None:
+				shapes.append(row[0])
+				feature_ids.append(row[1])
+			if len(shapes)>=batch_size or (row==None and len(shapes)>0):
+				#外接矩形左下角定位候选面，再要求右上角也在候选面外接矩形内
+				ext = numpy.array([[x.extent.XMin,x.extent.YMin,x.extent.XMax,x.extent.YMax] if x!=None else [numpy.nan]*4 for x in shapes],dtype=numpy.float64).reshape(-1,4)
+				pt_idx,pg_idx = index.candidates(ext[:,0:2])
+				bb = index.bboxes[pg_idx]
+				keep = (ext[pt_idx,2]<=bb[:,2])&(ext[pt_idx,3]<=bb[:,3])
+				pt_idx,pg_idx = pt_idx[keep],pg_idx[keep]
+				hit = numpy.array([polygons[j].contains(shapes[i]) for i,j in zip(pt_idx.tolist(),pg_idx.tolist())],dtype=bool).reshape(-1)
+				fea_idx.append(pt_idx[hit]+len(feature_ids)-len(shapes))
+				reg_idx.append(pg_idx[hit])
+				shapes = []
+			if row==None:
+				break
+		del cursor
+	empty = [numpy.zeros(0,dtype=numpy.intp)]
+	fea_idx = numpy.concatenate(fea_idx+empty).astype(numpy.intp)
+	reg_idx = numpy.concatenate(reg_idx+empty).astype(numpy.intp)
+	order = numpy.lexsort((reg_idx,fea_idx))
+	fea_idx,reg_idx = fea_idx[order],reg_idx[order]
+	
+	if record_field!=None:
+		bounds = numpy.searchsorted(fea_idx,numpy.arange(len(feature_ids)+1)).tolist()
+		regions = reg_idx.tolist()
+		try:
+			cursor=arcpy.da.UpdateCursor(iden_dataset,[record_field.decode("utf8")])
+		except:
+			cursor=arcpy.da.UpdateCursor(iden_dataset,[record_field])
+		fea = 0
+		for row in cursor:
+			comma=','
+			for k in range(bounds[fea],bounds[fea+1]):
+				comma+=str(region_ids[regions[k]])+','
+			cursor.updateRow([comma])
+			fea += 1
+		del cursor
+	
+	if join_table!=None:
+		folder,name = os.path.split(join_table)
+		table = arcpy.management.CreateTable(folder if folder!="" else "in_memory",name)[0]
+		feature_type = "OID" if feature_id_field==None else __field_type(iden_dataset,feature_id_field)
+		region_type = __field_type(region_dataset,idenitiy_field)
+		for field_name,source_type in [("feature_id",feature_type),("region_id",region_type)]:
+			field_type = __ADD_FIELD_TYPES.get(source_type,"TEXT")
+			if field_type=="TEXT":
+				arcpy.management.AddField(table,field_name,field_type,field_length=255)
+			else:
+				arcpy.management.AddField(table,field_name,field_type)
+		cursor = arcpy.da.InsertCursor(table,["feature_id","region_id"])
+		for i,j in zip(fea_idx.tolist(),reg_idx.tolist()):
+			cursor.insertRow([feature_ids[i],region_ids[j]])
+		del cursor
+		return table
 
 def __mean(func,list):
 	total = len(list)
@@ -162,121 +432,375 @@ def __sr_arg(spatial_reference):
 	else:
 		return spatial_reference
 
+#读取面的各环坐标，含曲线的面只取折点
+def _polygon_rings_(polygon):
+	if polygon==None:
+		return []
+	geo_json=json.loads(polygon.JSON)
+	if "rings" in geo_json:
+		return geo_json["rings"]
+	rings=[]
+	for part in polygon:
+		ring=[]
+		for pt in part:
+			if pt==None:
+				rings.append(ring)
+				ring=[]
+			else:
+				ring.append([pt.X,pt.Y])
+		rings.append(ring)
+	return rings
+
+class _PolygonIndex_:
+	"面要素的均匀格网索引及各面边线坐标数组，用于批量的点在面内判断(奇偶射线法)。\n_PolygonIndex_(面几何列表)"
+	def __init__(self,polygons):
+		x1,y1,x2,y2=[],[],[],[]
+		edge_count=[]
+		bboxes=[]
+		for polygon in polygons:
+			count=0
+			bbox=[numpy.inf,numpy.inf,-numpy.inf,-numpy.inf]
+			for ring in _polygon_rings_(polygon):
+				if len(ring)<2:
+					continue
+				arr=numpy.array([pt[0:2] for pt in ring],dtype=numpy.float64)
+				x1.append(arr[:,0])
+				y1.append(arr[:,1])
+				x2.append(numpy.roll(arr[:,0],-1))
+				y2.append(numpy.roll(arr[:,1],-1))
+				count+=len(arr)
+				bbox=[min(bbox[0],arr[:,0].min()),min(bbox[1],arr[:,1].min()),max(bbox[2],arr[:,0].max()),max(bbox[3],arr[:,1].max())]
+			edge_count.append(count)
+			bboxes.append(bbox)
+		empty=[numpy.zeros(0)]
+		self.x1=numpy.concatenate(x1+empty)
+		self.y1=numpy.concatenate(y1+empty)
+		self.x2=numpy.concatenate(x2+empty)
+		self.y2=numpy.concatenate(y2+empty)
+		self.edge_count=numpy.array(edge_count,dtype=numpy.intp)
+		self.edge_offset=numpy.concatenate([[0],numpy.cumsum(self.edge_count)[:-1]]).astype(numpy.intp)
+		self.bboxes=numpy.array(bboxes,dtype=numpy.float64).reshape(-1,4)
+		self.build_grid()
+	def build_grid(self):
+		"按外接矩形建立均匀格网，格网数约为面数量的4倍，每个面登记到其外接矩形覆盖的全部格子中"
+		valid=numpy.nonzero(self.bboxes[:,0]<=self.bboxes[:,2])[0]
+		if len(valid)==0:
+			self.origin=(0.0,0.0)
+			self.cell_size=1.0
+			self.grid_shape=(1,1)
+			self.cell_ptr=numpy.zeros(2,dtype=numpy.intp)
+			self.cell_polygons=numpy.zeros(0,dtype=numpy.intp)
+			return
+		bb=self.bboxes[valid]
+		min_x,min_y=bb[:,0].min(),bb[:,1].min()
+		width=max(bb[:,2].max()-min_x,1e-9)
+		height=max(bb[:,3].max()-min_y,1e-9)
+		self.cell_size=math.sqrt(width*height/(4.0*len(valid)))
+		self.cell_size=max(self.cell_size,max(width,height)/4096.0)
+		self.origin=(min_x,min_y)
+		nx=int(width/self.cell_size)+1
+		ny=int(height/self.cell_size)+1
+		self.grid_shape=(nx,ny)
+		cx0=numpy.clip(((bb[:,0]-min_x)/self.cell_size).astype(numpy.intp),0,nx-1)
+		cx1=numpy.clip(((bb[:,2]-min_x)/self.cell_size).astype(numpy.intp),0,nx-1)
+		cy0=numpy.clip(((bb[:,1]-min_y)/self.cell_size).astype(numpy.intp),0,ny-1)
+		cy1=numpy.clip(((bb[:,3]-min_y)/self.cell_size).astype(numpy.intp),0,ny-1)
+		span_x=cx1-cx0+1
+		counts=span_x*(cy1-cy0+1)
+		owner=numpy.repeat(numpy.arange(len(valid)),counts)
+		local=numpy.arange(counts.sum())-numpy.repeat(numpy.cumsum(counts)-counts,counts)
+		cells=(cy0[owner]+local//span_x[owner])*nx+cx0[owner]+local%span_x[owner]
+		order=numpy.argsort(cells,kind="mergesort")
+		self.cell_polygons=valid[owner[order]]
+		self.cell_ptr=numpy.concatenate([[0],numpy.cumsum(numpy.bincount(cells,minlength=nx*ny))]).astype(numpy.intp)
+	def candidates(self,xy):
+		"返回外接矩形包含点的(点序号,面序号)候选对"
+		nx,ny=self.grid_shape
+		cx=numpy.floor((xy[:,0]-self.origin[0])/self.cell_size)
+		cy=numpy.floor((xy[:,1]-self.origin[1])/self.cell_size)
+		inside=(cx>=0)&(cx<nx)&(cy>=0)&(cy<ny)
+		points=numpy.nonzero(inside)[0]
+		cells=(cy[inside]*nx+cx[inside]).astype(numpy.intp)
+		start=self.cell_ptr[cells]
+		counts=self.cell_ptr[cells+1]-start
+		pt_idx=numpy.repeat(points,counts)
+		local=numpy.arange(counts.sum())-numpy.repeat(numpy.cumsum(counts)-counts,counts)
+		pg_idx=self.cell_polygons[numpy.repeat(start,counts)+local]
+		bb=self.bboxes[pg_idx]
+		px,py=xy[pt_idx,0],xy[pt_idx,1]
+		keep=(px>=bb[:,0])&(px<=bb[:,2])&(py>=bb[:,1])&(py<=bb[:,3])
+		return pt_idx[keep],pg_idx[keep]
+	def contains(self,xy,max_work=4000000):
+		"返回点落在面内的(点序号,面序号)对，xy为n×2数组；按边数分块做奇偶射线判断"
+		pt_idx,pg_idx=self.candidates(xy)
+		if len(pt_idx)==0:
+			return pt_idx,pg_idx
+		work=numpy.cumsum(self.edge_count[pg_idx])
+		bounds=numpy.searchsorted(work,numpy.arange(max_work,work[-1],max_work))
+		bounds=numpy.unique(numpy.concatenate([[0],bounds+1,[len(pt_idx)]]))
+		result=numpy.zeros(len(pt_idx),dtype=bool)
+		for start,stop in zip(bounds[:-1],bounds[1:]):
+			pts,pgs=pt_idx[start:stop],pg_idx[start:stop]
+			counts=self.edge_count[pgs]
+			pair=numpy.repeat(numpy.arange(len(pts)),counts)
+			edge=numpy.repeat(self.edge_offset[pgs],counts)+numpy.arange(counts.sum())-numpy.repeat(numpy.cumsum(counts)-counts,counts)
+			px,py=xy[pts[pair],0],xy[pts[pair],1]
+			x1,y1,x2,y2=self.x1[edge],self.y1[edge],self.x2[edge],self.y2[edge]
+			straddle=(y1>py)!=(y2>py)
+			dy=numpy.where(straddle,y2-y1,1.0)
+			cross=straddle&(px<(x2-x1)*(py-y1)/dy+x1)
+			result[start:stop]=numpy.bincount(pair,weights=cross,minlength=len(pts))%2==1
+		return pt_idx[result],pg_idx[result]
+
+#按批读取点要素坐标，每批返回(起始序号,n×2数组,其余字段行列表)
+def __point_batches(point_dataset,fields=[],spatial_reference=None,batch_size=200000):
+	xy=[]
+	rows=[]
+	start=0
+	for row in arcpy.da.SearchCursor(point_dataset,["SHAPE@XY"]+fields,spatial_reference=spatial_reference):
+		xy.append(row[0] if row[0][0]!=None else (numpy.nan,numpy.nan))
+		rows.append(row[1:])
+		if len(xy)>=batch_size:
+			yield start,numpy.array(xy,dtype=numpy.float64),rows
+			start+=len(xy)
+			xy=[]
+			rows=[]
+	if len(xy)>0:
+		yield start,numpy.array(xy,dtype=numpy.float64),rows
+
 #ContainsCounter('点要素','面要素','面统计字段')
-def ContainsCounter(point_dataset,polygon_dataset,counter_field,spatial_reference=True):
+def ContainsCounter(point_dataset,polygon_dataset,counter_field,spatial_reference=True,batch_size=200000):
 	if not __geo_type(point_dataset) == "Point":raise Exception("第1参数不是点要素")
 	if not __geo_type(polygon_dataset) == "Polygon":raise Exception("第2参数不是面要素")
 	if not __has_field(polygon_dataset,counter_field):raise Exception("第2参数没有目标字段")
 	if not __field_type(polygon_dataset,counter_field) == "Integer":raise Exception("目标字段不是整型")
 	
+	ContainsAggregator(point_dataset,polygon_dataset,[(None,"COUNT",counter_field)],spatial_reference,batch_size)
+
+#一次遍历点要素，按所在面统计多个指标并写回面要素
+#stats为[(点字段,统计方式,面输出字段),...]，统计方式有COUNT(点数量，点字段可为None)、SUM、MEAN、MIN、MAX、DISTINCT(不同值个数)，
+#加权平均为(点字段,"WEIGHTED_MEAN",面输出字段,权重字段)；空值不参与统计，没有点的面MEAN、MIN、MAX、WEIGHTED_MEAN为空值
+#面输出字段不存在时自动创建，COUNT和DISTINCT为LONG，其余为DOUBLE
+#ContainsAggregator('POI','地块',[(None,"COUNT","poi_cnt"),("price","MEAN","price_avg"),("type","DISTINCT","type_cnt"),("price","WEIGHTED_MEAN","price_wavg","area")])
+def ContainsAggregator(point_dataset,polygon_dataset,stats,spatial_reference=True,batch_size=200000):
+	if not __geo_type(point_dataset) == "Point":raise Exception("第1参数不是点要素")
+	if not __geo_type(polygon_dataset) == "Polygon":raise Exception("第2参数不是面要素")
+	stats=[(x[0],x[1].upper(),x[2],x[3] if len(x)>3 else None) for x in stats]
+	for point_field,stat,out_field,weight_field in stats:
+		if not stat in ["COUNT","SUM","MEAN","MIN","MAX","DISTINCT","WEIGHTED_MEAN"]:
+			raise Exception("无效的统计方式："+stat)
+		if stat!="COUNT" and point_field==None:
+			raise Exception(stat+"统计需要点字段")
+		if stat=="WEIGHTED_MEAN" and weight_field==None:
+			raise Exception("WEIGHTED_MEAN统计需要权重字段")
+	point_fields=[]
+	for point_field,stat,out_field,weight_field in stats:
+		for field in [point_field,weight_field]:
+			if field!=None and not field in point_fields:
+				point_fields.append(field)
+	
 	sr = __sr_arg(spatial_reference)
 	
 	polygons = []
 	for row in arcpy.da.SearchCursor(polygon_dataset,["SHAPE@"],spatial_reference=sr):
 		polygons.append(row[0])
-	del row
+	index = _PolygonIndex_(polygons)
+	del polygons
+	count = len(index.bboxes)
 	
-	min_x = arcpy.Describe(polygon_dataset).extent.XMin
-	max_x = arcpy.Describe(polygon_dataset).extent.XMax
-	min_y = arcpy.Describe(polygon_dataset).extent.YMin
-	max_y = arcpy.Describe(polygon_dataset).extent.YMax
-	tot_w = arcpy.Describe(polygon_dataset).extent.width
-	tot_h = arcpy.Describe(polygon_dataset).extent.height
-	mea_w = __mean(lambda x:x.extent.width,  polygons)
-	mea_h = __mean(lambda x:x.extent.height, polygons)
-	
-	x_index = [set() for i in range(int(math.ceil(float(tot_w) / mea_w))+1)]
-	y_index = [set() for i in range(int(math.ceil(float(tot_h) / mea_h))+1)]
-	count = len(polygons)
-	for row in range(count):
-		ext = polygons[row].extent
-		x_idx_min = int(math.ceil(float(ext.XMin - min_x) / mea_w))
-		x_idx_max = int(math.ceil(float(ext.XMax - min_x) / mea_w))
-		y_idx_min = int(math.ceil(float(ext.YMin - min_y) / mea_h))
-		y_idx_max = int(math.ceil(float(ext.YMax - min_y) / mea_h))
-		for xx in range(x_idx_min, x_idx_max + 1):
-			x_index[xx].add(row)
-		for yy in range(y_idx_min, y_idx_max + 1):
-			y_index[yy].add(row)
+	#各统计量的累加器，以面序号为下标
+	acc = []
+	for point_field,stat,out_field,weight_field in stats:
+		if stat=="MIN":
+			acc.append([numpy.full(count,numpy.inf)])
+		elif stat=="MAX":
+			acc.append([numpy.full(count,-numpy.inf)])
+		elif stat=="DISTINCT":
+			acc.append([[],{}])
+		else:
+			acc.append([numpy.zeros(count),numpy.zeros(count)])
+	for start,xy,rows in __point_batches(point_dataset,point_fields,sr,batch_size):
+		pt_idx,pg_idx = index.contains(xy)
+		columns = {}
+		for k in range(len(point_fields)):
+			columns[point_fields[k]] = [row[k] for row in rows]
+		#数值数组单独缓存，不替换原始值列表，使各统计结果与stats的顺序无关
+		numbers = {}
+		def numeric(field):
+			if not field in numbers:
+				numbers[field] = numpy.array([numpy.nan if x==None else x for x in columns[field]],dtype=numpy.float64)
+			return numbers[field][pt_idx]
+		for k,(point_field,stat,out_field,weight_field) in enumerate(stats):
+			if stat=="COUNT":
+				if point_field==None:
+					acc[k][0] += numpy.bincount(pg_idx,minlength=count)
+				else:
+					values = columns[point_field]
+					valid = numpy.array([values[i]!=None and values[i]==values[i] for i in pt_idx.tolist()],dtype=bool)
+					acc[k][0] += numpy.bincount(pg_idx[valid],minlength=count)
+			elif stat=="DISTINCT":
+				codes = acc[k][1]
+				values = columns[point_field]
+				valid = numpy.array([values[i]!=None and values[i]==values[i] for i in pt_idx.tolist()],dtype=bool)
+				value_codes = numpy.array([codes.setdefault(values[i],len(codes)) for i in pt_idx[valid].tolist()],dtype=numpy.int64)
+				acc[k][0].append(numpy.unique(pg_idx[valid].astype(numpy.int64)*(2**32)+value_codes))
+			else:
+				v = numeric(point_field)
+				valid = ~numpy.isnan(v)
+				if stat=="WEIGHTED_MEAN":
+					w = numeric(weight_field)
+					valid &= ~numpy.isnan(w)
+					acc[k][0] += numpy.bincount(pg_idx[valid],weights=v[valid]*w[valid],minlength=count)
+					acc[k][1] += numpy.bincount(pg_idx[valid],weights=w[valid],minlength=count)
+				elif stat=="MIN":
+					numpy.minimum.at(acc[k][0],pg_idx[valid],v[valid])
+				elif stat=="MAX":
+					numpy.maximum.at(acc[k][0],pg_idx[valid],v[valid])
+				else:
+					acc[k][0] += numpy.bincount(pg_idx[valid],weights=v[valid],minlength=count)
+					acc[k][1] += numpy.bincount(pg_idx[valid],minlength=count)
 	
-	point_counts = [0 for i in range(len(polygons))]
-	for row in arcpy.da.SearchCursor(point_dataset,["SHAPE@"],spatial_reference=sr):
-		if row[0]==None:
-			continue
-		point_xy = row[0].centroid
-		x_idx = int(math.ceil(float(point_xy.X - min_x) / mea_w))
-		y_idx = int(math.ceil(float(point_xy.Y - min_y) / mea_h))
-		polygons_rough = x_index[x_idx].intersection(y_index[y_idx])
-		for polygon_idx in list(polygons_rough):
-			if polygons[polygon_idx].contains(row[0]):
-				point_counts[polygon_idx]+=1
-	del row
+	#汇总结果，空值用None表示
+	results = []
+	for k,(point_field,stat,out_field,weight_field) in enumerate(stats):
+		if stat=="COUNT":
+			res = acc[k][0].astype(numpy.int64).tolist()
+		elif stat=="DISTINCT":
+			pairs = numpy.unique(numpy.concatenate(acc[k][0]+[numpy.zeros(0,dtype=numpy.int64)]))
+			res = numpy.bincount((pairs//(2**32)).astype(numpy.intp),minlength=count).tolist()
+		elif stat=="SUM":
+			res = acc[k][0].tolist()
+		elif stat in ["MIN","MAX"]:
+			res = [None if numpy.isinf(x) else x for x in acc[k][0].tolist()]
+		else:
+			total,weight = acc[k][0],acc[k][1]
+			res = numpy.where(weight!=0,total/numpy.where(weight!=0,weight,1),numpy.nan).tolist()
+			res = [None if numpy.isnan(x) else x for x in res]
+		results.append(res)
 	
-	cursor=arcpy.da.UpdateCursor(polygon_dataset,[counter_field])
+	field_names = [x.name for x in arcpy.Describe(polygon_dataset).fields]
+	out_fields = [x[2] for x in stats]
+	for point_field,stat,out_field,weight_field in stats:
+		if not out_field in field_names:
+			arcpy.management.AddField(polygon_dataset,out_field,"LONG" if stat in ["COUNT","DISTINCT"] else "DOUBLE")
+			field_names.append(out_field)
+	cursor=arcpy.da.UpdateCursor(polygon_dataset,out_fields)
 	polygon_idx=0
 	for row in cursor:
-		row[0]=point_counts[polygon_idx]
-		cursor.updateRow(row)
+		cursor.updateRow([x[polygon_idx] for x in results])
 		polygon_idx+=1
-	del row,cursor
+	del cursor
 
 
 
 #utf8_field这个参数名称有点问题
+#FieldExtractor、FieldLister、FieldDicter通过codetool.cache读取整列，数据未修改时重复调用不再读表
 def FieldExtractor(dataset,field_name,utf8_field=True,key=lambda x:x):
 	ll=set()
-	cursor=arcpy.UpdateCursor(dataset)
-	for row in cursor:
-		str=row.getValue(field_name.decode("utf8"))
+	for str in ct_cache.read_column(dataset,__unicode_arg(field_name)).tolist():
 		if not utf8_field:
 			str=str.encode("utf8")
 		ll.add(str)
-	del row,cursor
 	return list(ll)
 
 
 #utf8_field这个参数名称有点问题
 def FieldLister(dataset,field_name,utf8_field=True,key=lambda x:x):
 	ll=[]
-	cursor=arcpy.da.SearchCursor(dataset,[field_name.decode("utf8")])
-	for row in cursor:
-		str=row[0]
+	for str in ct_cache.read_column(dataset,__unicode_arg(field_name)).tolist():
 		if not utf8_field:
 			str=str.encode("utf8")
 		ll.append(key(str))
-	del row,cursor
 	return ll
 
 def FieldDicter(datatab, key_field, value_field):
+	keys = ct_cache.read_column(datatab,key_field).tolist()
+	values = ct_cache.read_column(datatab,value_field).tolist()
+	return dict(zip(keys,values))
+
+#读取ContainsRecorder输出的关联表，by="FEATURE"时返回{feature_id:region_id集合}，by="REGION"时返回{region_id:feature_id集合}
+#index=ContainsDicter('in_memory/iden_region');Adjacent2GeoNetwork(...,criterion=lambda x,y:y in index.get(x,()))
+def ContainsDicter(join_table,by="FEATURE"):
+	if by.upper()=="FEATURE":
+		fields=["feature_id","region_id"]
+	elif by.upper()=="REGION":
+		fields=["region_id","feature_id"]
+	else:
+		raise Exception("无效的索引方式："+by)
 	res={}
-	cursor = arcpy.da.SearchCursor(datatab,[key_field,value_field])
+	cursor = arcpy.da.SearchCursor(join_table,fields)
 	for row in cursor:
-		res[row[0]]=row[1]
-	del row,cursor
+		res.setdefault(row[0],set()).add(row[1])
+	del cursor
 	return res
 
+__GEOMETRY_ATTRIBUTES = ["CENTROID_X","CENTROID_Y","LENGTH","AREA","BEARING","SINUOSITY","COMPACTNESS"]
+
+#一次读取几何属性并向量化计算后一次写回，attributes为[(几何属性,输出字段),...]，输出字段不存在时创建为DOUBLE
+#CENTROID_X、CENTROID_Y为质心坐标；LENGTH为长度(面为周长)；AREA为面积；
+#BEARING为起点指向终点的方位角，自x轴正向逆时针计，弧度，范围[0,2π)；SINUOSITY为长度与起终点直线距离之比；COMPACTNESS为4πA/P²
+#无法计算的值(空几何、起终点重合等)写为空值
+#GeometryAttributes("道路",[("BEARING","angle"),("SINUOSITY","sinu")])
+def GeometryAttributes(dataset,attributes,sr=None):
+	attributes=[(x[0].upper(),__unicode_arg(x[1])) for x in attributes]
+	for attribute,out_field in attributes:
+		if not attribute in __GEOMETRY_ATTRIBUTES:
+			raise Exception("无效的几何属性："+attribute)
+	names=set([x[0] for x in attributes])
+	tokens=["SHAPE@XY","SHAPE@LENGTH","SHAPE@AREA"]
+	with_ends = "BEARING" in names or "SINUOSITY" in names
+	if with_ends:
+		tokens.append("SHAPE@")
+	rows=[]
+	for row in arcpy.da.SearchCursor(dataset,tokens,spatial_reference=sr):
+		if row[0]==None or row[0][0]==None:
+			rows.append([numpy.nan]*8)
+			continue
+		values=[row[0][0],row[0][1],row[1],row[2]]
+		if with_ends:
+			first,last=row[3].firstPoint,row[3].lastPoint
+			values+=[first.X,first.Y,last.X,last.Y]
+		else:
+			values+=[numpy.nan]*4
+		rows.append(values)
+	arr=numpy.array(rows,dtype=numpy.float64).reshape(-1,8)
+	
+	length=arr[:,2]
+	area=arr[:,3]
+	dx=arr[:,6]-arr[:,4]
+	dy=arr[:,7]-arr[:,5]
+	chord=numpy.hypot(dx,dy)
+	with numpy.errstate(divide="ignore",invalid="ignore"):
+		columns={
+			"CENTROID_X":arr[:,0],
+			"CENTROID_Y":arr[:,1],
+			"LENGTH":length,
+			"AREA":area,
+			"BEARING":numpy.where(chord>0,numpy.mod(numpy.arctan2(dy,dx),2*math.pi),numpy.nan),
+			"SINUOSITY":numpy.where(chord>0,length/chord,numpy.nan),
+			"COMPACTNESS":numpy.where(length>0,4*math.pi*area/length**2,numpy.nan)
+			}
+	results=[[None if v!=v else v for v in columns[attribute].tolist()] for attribute,out_field in attributes]
+	
+	field_names=[x.name for x in arcpy.Describe(dataset).fields]
+	for attribute,out_field in attributes:
+		if not out_field in field_names:
+			arcpy.management.AddField(dataset,out_field,"DOUBLE")
+			field_names.append(out_field)
+	cursor=arcpy.da.UpdateCursor(dataset,[x[1] for x in attributes])
+	idx=0
+	for row in cursor:
+		cursor.updateRow([x[idx] for x in results])
+		idx+=1
+	del cursor
+
+#线段方位角，自x轴正向逆时针计，弧度，范围[0,2π)
 def edge_angle(edge_dataset,field_name):
-	with arcpy.da.UpdateCursor(edge_dataset, ["SHAPE@",field_name]) as cursor:
-		for row in cursor:
-			edge=row[0].getPart()[0]
-			if edge[1].X==edge[0].X:
-				row[1]=0
-			else:
-				row[1]=math.atan((edge[1].Y-edge[0].Y)/(edge[1].X-edge[0].X))
-			cursor.updateRow(row)
+	GeometryAttributes(edge_dataset,[("BEARING",field_name)])
 	
 	
 def XYGenerator(dataset,field_x,field_y,sr=None):
-	if sr==None:
-		cursor=arcpy.UpdateCursor(dataset)
-	else:
-		cursor=arcpy.UpdateCursor(dataset,spatial_reference=sr)
-	for row in cursor:
-		xy=row.getValue("Shape").centroid
-		row.setValue(field_x.decode("utf8"),xy.X)
-		row.setValue(field_y.decode("utf8"),xy.Y)
-		cursor.updateRow(row)
-	del row,cursor
+	GeometryAttributes(dataset,[("CENTROID_X",field_x),("CENTROID_Y",field_y)],sr)
 
 #在照片转出的点要素基础上在targetpath目录中生成一个bat文件
 #运行bat文件可以将选中的图片点要素照片硬连接到此处
@@ -300,8 +824,96 @@ def HardLinkGenerator(dataset,targetpath):
 	fout.write("pause")
 	fout.close()
 
+#创建硬连接，py2的Windows版没有os.link，改用CreateHardLinkW
+def __hard_link(source,target):
+	if hasattr(os,"link"):
+		os.link(source,target)
+		return
+	import ctypes
+	if not ctypes.windll.kernel32.CreateHardLinkW(u"%s"%(target,),u"%s"%(source,),None):
+		raise OSError(ctypes.GetLastError(),"CreateHardLinkW failed")
 
-def random_field_values(dataset, field_name, rand_value_func=lambda x:x*2.0-1.0):
+#将source连接到target，无法建立硬连接(跨分区、文件系统不支持等)且copy_fallback为True时复制文件
+#返回LINKED、COPIED、SKIPPED(已存在同一文件或同大小同修改时间的副本)、EXISTS(已存在其他文件，不覆盖)或FAILED
+def __link_task(task):
+	source,target,copy_fallback=task
+	try:
+		st=os.stat(source)
+		if os.path.exists(target):
+			tt=os.stat(target)
+			if st.st_ino!=0 and (st.st_ino,st.st_dev)==(tt.st_ino,tt.st_dev):
+				return "SKIPPED",source
+			if st.st_size==tt.st_size and int(st.st_mtime)==int(tt.st_mtime):
+				return "SKIPPED",source
+			return "EXISTS",source
+		folder=os.path.dirname(target)
+		if folder!="" and not os.path.isdir(folder):
+			try:
+				os.makedirs(folder)
+			except OSError:
+				pass
+		try:
+			__hard_link(source,target)
+			return "LINKED",source
+		except (OSError,AttributeError):
+			if not copy_fallback:
+				raise
+		shutil.copy2(source,target)
+		return "COPIED",source
+	except Exception:
+		return "FAILED",source
+
+#直接在targetpath中建立照片点要素的硬连接(Path字段为原文件，Name字段为连接名)，不能建立硬连接时复制
+#用threads个线程并行执行，progress(已完成数,总数)用于报告进度，为None时更新arcpy进度条
+#返回各结果的数量，如{"LINKED":99990,"SKIPPED":10}
+#HardLinkExecutor("照片点","D:/photos/selected",threads=16)
+def HardLinkExecutor(dataset,targetpath,threads=8,copy_fallback=True,progress=None):
+	tasks=[]
+	for row in arcpy.da.SearchCursor(dataset,["Path","Name"]):
+		tasks.append((row[0],os.path.join(targetpath,row[1]),copy_fallback))
+	total=len(tasks)
+	if progress==None:
+		arcpy.SetProgressor("step",u"正在建立硬连接……",0,max(total,1),1)
+		progress=lambda done,total:arcpy.SetProgressorPosition(done)
+	counts={}
+	failures=[]
+	step=max(total//100,1)
+	pool=multiprocessing.pool.ThreadPool(threads)
+	try:
+		done=0
+		for status,source in pool.imap_unordered(__link_task,tasks,chunksize=64):
+			counts[status]=counts.get(status,0)+1
+			if status=="FAILED":
+				failures.append(source)
+			done+=1
+			if done%step==0 or done==total:
+				progress(done,total)
+	finally:
+		pool.close()
+		pool.join()
+	for source in failures[:10]:
+		arcpy.AddWarning(u"未能连接："+source)
+	if len(failures)>10:
+		arcpy.AddWarning(u"共%d个文件未能连接"%(len(failures),))
+	return counts
+
+
+#seed和stream确定的随机数生成器，相同seed的不同stream相互独立，用于并行的蒙特卡洛模拟
+#旧版numpy没有Generator时退回RandomState
+def __random_generator(seed=None,stream=0):
+	if hasattr(numpy.random,"default_rng"):
+		return numpy.random.default_rng(numpy.random.SeedSequence(seed,spawn_key=(stream,)))
+	if seed==None:
+		return numpy.random.RandomState()
+	return numpy.random.RandomState([seed%(2**32),stream%(2**32)])
+
+#distribution为None时逐行调用rand_value_func(0~1均匀随机数)；
+#否则一次生成整列：NORMAL为正态分布N(loc,scale)，UNIFORM为[loc-scale,loc+scale]上的均匀分布，
+#LOGNORMAL为对数正态分布(loc、scale为对应正态分布的均值和标准差)，PPF为rand_value_func(0~1均匀随机数数组)，rand_value_func需接受数组
+#seed不为None时结果可复现，并行的多次模拟使用同一seed、不同stream
+#random_field_values("地块","sim",distribution="NORMAL",loc=10,scale=2,seed=42,stream=3)
+#random_field_values("地块","sim",scipy.stats.gamma(2.0).ppf,distribution="PPF",seed=42)
+def random_field_values(dataset, field_name, rand_value_func=lambda x:x*2.0-1.0, distribution=None, loc=0.0, scale=1.0, seed=None, stream=0):
 	fields = arcpy.Describe(dataset).fields
 	field_names = [x.name for x in fields]
 	field_types = [x.type for x in fields]
@@ -311,10 +923,34 @@ def random_field_values(dataset, field_name, rand_value_func=lambda x:x*2.0-1.0)
 		raise Exception("Field %s is not found"%(field_name,))
 	if not field_types[field_index] in ['Double', 'Single']:
 		raise Exception("Invalid field type %s is found"%(field_types[field_index],))
+	if distribution==None:
+		with arcpy.da.UpdateCursor(dataset, [field_name]) as cursor:
+			for row in cursor:
+				row = [rand_value_func(get_random())]
+				cursor.updateRow(row)
+		return
+	
+	distribution = distribution.upper()
+	count = int(arcpy.management.GetCount(dataset)[0])
+	rng = __random_generator(seed,stream)
+	if distribution=="NORMAL":
+		values = rng.normal(loc,scale,count)
+	elif distribution=="UNIFORM":
+		values = rng.uniform(loc-scale,loc+scale,count)
+	elif distribution=="LOGNORMAL":
+		values = rng.lognormal(loc,scale,count)
+	elif distribution=="PPF":
+		values = numpy.asarray(rand_value_func(rng.uniform(0.0,1.0,count)),dtype=numpy.float64).reshape(-1)
+		if len(values)!=count:
+			raise Exception("rand_value_func返回的数组长度与行数不一致")
+	else:
+		raise Exception("Invalid distribution %s"%(distribution,))
+	values = values.tolist()
 	with arcpy.da.UpdateCursor(dataset, [field_name]) as cursor:
+		idx = 0
 		for row in cursor:
-			row = [rand_value_func(get_random())]
-			cursor.updateRow(row)
+			cursor.updateRow([values[idx]])
+			idx += 1
 
 
 
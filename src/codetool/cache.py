@@ -0,0 +1,120 @@
+# -*- coding: UTF-8 -*-
+# 字段列缓存：按(数据路径,字段,空间参考)缓存整列的值，数据修改时间或行数变化时失效，超过内存预算时淘汰最久未使用的列
+
+import arcpy
+import os
+import os.path
+import sys
+import numbers
+import collections
+import numpy
+
+#数据文件的修改时间，shapefile取各组成文件，文件地理数据库取库内文件的最大值
+#in_memory、SDE等不在文件系统中的数据返回None，此时不使用缓存
+def _modified_time_(catalog_path):
+	path = catalog_path
+	while path!="" and not os.path.exists(path):
+		parent = os.path.split(path)[0]
+		if parent==path:
+			return None
+		path = parent
+	if path=="" or path.lower().endswith(".sde"):
+		return None
+	if os.path.isfile(path):
+		base = os.path.splitext(path)[0]
+		files = [path]+[base+ext for ext in [".dbf",".shx"] if path.lower().endswith(".shp")]
+	elif path.lower().endswith(".gdb"):
+		files = [os.path.join(path,x) for x in os.listdir(path)]
+	else:
+		return None
+	return max([os.path.getmtime(x) for x in files if os.path.isfile(x)]+[os.path.getmtime(path)])
+
+#图层有选择集或定义查询时读到的是部分记录，不使用缓存
+def _filtered_(dataset,desc):
+	if getattr(dataset,"definitionQuery",""):
+		return True
+	return bool(getattr(desc,"FIDSet","")) or bool(getattr(desc,"whereClause",""))
+
+def _sr_key_(spatial_reference):
+	if hasattr(spatial_reference,"exportToString"):
+		return spatial_reference.exportToString()
+	return spatial_reference
+
+#读取整列，数值列且无空值时为数值数组，否则为对象数组
+def _read_column_(dataset,field,spatial_reference):
+	values = [row[0] for row in arcpy.da.SearchCursor(dataset,[field],spatial_reference=spatial_reference)]
+	if len(values)>0 and all([isinstance(x,numbers.Real) for x in values]):
+		return numpy.array(values)
+	column = numpy.empty(len(values),dtype=object)
+	for i in range(len(values)):
+		column[i] = values[i]
+	return column
+
+#估算列占用的内存，几何对象按每个折点16字节计
+def _column_bytes_(column):
+	if column.dtype!=object:
+		return column.nbytes
+	return column.nbytes+sum([sys.getsizeof(x)+16*getattr(x,"pointCount",0) for x in column.tolist()])
+
+class ColumnCache:
+	"按(数据路径,字段,空间参考)缓存整列字段值，总量超过memory_budget字节时淘汰最久未使用的列。\nColumnCache(memory_budget=256*1024*1024)"
+	def __init__(self,memory_budget=256*1024*1024):
+		self.memory_budget = memory_budget
+		self.columns = collections.OrderedDict()
+		self.nbytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.bypasses = 0
+	def read(self,dataset,field,spatial_reference=None):
+		"返回字段整列的numpy数组，该数组由缓存共享，不要原地修改"
+		desc = arcpy.Describe(dataset)
+		catalog_path = desc.catalogPath
+		mtime = None if _filtered_(dataset,desc) else _modified_time_(catalog_path)
+		if mtime==None:
+			self.bypasses += 1
+			return _read_column_(dataset,field,spatial_reference)
+		count = int(arcpy.management.GetCount(catalog_path)[0])
+		key = (os.path.normcase(catalog_path),field,_sr_key_(spatial_reference))
+		item = self.columns.pop(key,None)
+		if item!=None:
+			if item[0]==mtime and item[1]==count:
+				self.columns[key] = item
+				self.hits += 1
+				return item[2]
+			self.nbytes -= item[3]
+		self.misses += 1
+		column = _read_column_(catalog_path,field,spatial_reference)
+		size = _column_bytes_(column)
+		if size<=self.memory_budget:
+			self.columns[key] = (mtime,count,column,size)
+			self.nbytes += size
+			self.evict()
+		return column
+	def evict(self):
+		"淘汰最久未使用的列直到总量不超过memory_budget"
+		while self.nbytes>self.memory_budget and len(self.columns)>0:
+			key,item = self.columns.popitem(last=False)
+			self.nbytes -= item[3]
+	def invalidate(self,dataset=None):
+		"清除某个数据的全部缓存列，dataset为None时清空缓存"
+		if dataset==None:
+			self.columns.clear()
+			self.nbytes = 0
+			return
+		path = os.path.normcase(arcpy.Describe(dataset).catalogPath)
+		for key in [x for x in self.columns.keys() if x[0]==path]:
+			self.nbytes -= self.columns.pop(key)[3]
+
+#供各读取函数共用的缓存
+column_cache = ColumnCache()
+
+#read_column("地块","用地性质")
+def read_column(dataset,field,spatial_reference=None):
+	return column_cache.read(dataset,field,spatial_reference)
+
+def set_memory_budget(memory_budget):
+	column_cache.memory_budget = memory_budget
+	column_cache.evict()
+
+def invalidate(dataset=None):
+	column_cache.invalidate(dataset)
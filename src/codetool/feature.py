@@ -2,6 +2,7 @@
 # 根据图层返回集合列表
 
 import arcpy
+from cache import read_column
 
 def __active_df_sr():
 	try:
@@ -17,25 +18,17 @@ def __sr_arg(spatial_reference):
 	else:
 		return spatial_reference
 
+#to_list、to_set通过cache读取整列，数据未修改时重复调用不再读表
 def to_list(dataset,field="SHAPE@",key=None):
-	res=[]
-	cursor=arcpy.da.SearchCursor(dataset,[field],spatial_reference=__active_df_sr())
+	column=read_column(dataset,field,__active_df_sr()).tolist()
 	if key==None:
-		key = lambda x:x
-	for row in cursor:
-		res.append(key(row[0]))
-	del row,cursor
-	return res
+		return column
+	return [key(x) for x in column]
 
 def to_set(dataset,field="SHAPE@",key=None):
-	res=set()
-	cursor=arcpy.da.SearchCursor(dataset,[field],spatial_reference=__active_df_sr())
 	if key==None:
 		key = lambda x:x
-	for row in cursor:
-		res.add(key(row[0]))
-	del row,cursor
-	return res
+	return set([key(x) for x in read_column(dataset,field,__active_df_sr()).tolist()])
 
 def to_dict(dataset,field="SHAPE@"):
 	res=[]
@@ -4,112 +4,78 @@ import arcpy.sa
 import arcpy.da
 import sys
 import os.path
+import math
+import itertools
 sys.path.append(os.path.split(__file__)[0])
-import codetool.feature as ct_fea
+import attr
+import geoop.transform as geo_trans
 	
 	
+#平移全部几何，多部分要素的各部分一起平移
 def PointMove(dataset,x_offset,y_offset):
-	cursor=arcpy.da.UpdateCursor(dataset,["SHAPE@"])
-	for row in cursor:
-		geo=row[0]
-		if type(geo) == arcpy.geometries.PointGeometry:
-			ptr=geo.firstPoint
-			ptr.X+=x_offset
-			ptr.Y+=y_offset
-			row[0]=arcpy.geometries.PointGeometry(ptr)
-		elif type(geo) == arcpy.geometries.Polyline:
-			arr=geo.getPart()[0]
-			for i in arr:
-				i.X+=x_offset
-				i.Y+=y_offset
-			row[0]=arcpy.Polyline(arcpy.Array(arr))
-		elif type(geo) == arcpy.geometries.Polygon:
-			arr=geo.getPart()
-			for i in arr:
-				for j in i:
-					j.X+=x_offset
-					j.Y+=y_offset
-			row[0]=arcpy.Polygon(arcpy.Array(arr))
-		else:
-			print(type(geo))
-			raise Exception("错误的文件几何类型")
-		cursor.updateRow(row)
-	del row,cursor
+	geo_trans.affine_dataset(dataset,geo_trans.affine_matrix(translate=(x_offset,y_offset)))
 
 
+#以(0,0)为原点缩放全部几何
 def GeoZone(dataset,x_times,y_times):
-	cursor=arcpy.da.UpdateCursor(dataset,["SHAPE@"])
-	for row in cursor:
-		geo=row[0]
-		if type(geo) == arcpy.geometries.PointGeometry:
-			ptr=geo.firstPoint
-			ptr.X*=x_times
-			ptr.Y*=y_times
-			row[0]=arcpy.geometries.PointGeometry(ptr)
-		elif type(geo) == arcpy.geometries.Polyline:
-			arr=geo.getPart()[0]
-			for i in arr:
-				i.X*=x_times
-				i.Y*=y_times
-			row[0]=arcpy.Polyline(arcpy.Array(arr))
-		elif type(geo) == arcpy.geometries.Polygon:
-			arr=geo.getPart()
-			for i in arr:
-				for j in i:
-					j.X*=x_times
-					j.Y*=y_times
-			row[0]=arcpy.Polygon(arcpy.Array(arr))
+	geo_trans.affine_dataset(dataset,geo_trans.affine_matrix(scale=(x_times,y_times)))
+
+
+#由attr.ContainsRecorder实现，面ID取FID字段；join_table不为None时另存(feature_id,region_id)关联表
+def ContainsRecorder(iden_dataset,region_dataset,record_field,join_table=None):
+	return attr.ContainsRecorder(iden_dataset,record_field,region_dataset,"FID",join_table)
+
+#按几何相等分组，返回[(代表几何,[OID,...]),...]，按首次出现的顺序排列，空几何不参与
+#以几何类型和按grid_size量化后的外接矩形为哈希键，grid_size默认为XY容差的100倍
+#容差内相等的几何外接矩形坐标相差不超过2倍容差，查找时同时探查各坐标在该范围内落入的相邻格网，跨格网线的相等几何不会漏判
+def __geometry_groups(dataset,grid_size=None):
+	tolerance=arcpy.Describe(dataset).spatialReference.XYTolerance
+	if grid_size==None:
+		grid_size=100.0*tolerance if tolerance>0 else 0.1
+	margin=2.0*max(tolerance,0.0)
+	buckets={}
+	groups=[]
+	for oid,geo in arcpy.da.SearchCursor(dataset,["OID@","SHAPE@"]):
+		if geo==None:
+			continue
+		ext=geo.extent
+		coords=[ext.XMin,ext.YMin,ext.XMax,ext.YMax]
+		key=(geo.type,)+tuple([int(math.floor(x/grid_size)) for x in coords])
+		cells=[range(int(math.floor((x-margin)/grid_size)),int(math.floor((x+margin)/grid_size))+1) for x in coords]
+		for probe in itertools.product(*cells):
+			bucket=buckets.get((geo.type,)+probe)
+			if bucket==None:
+				continue
+			group_idx=next((x for x in bucket if groups[x][0].equals(geo)),None)
+			if group_idx!=None:
+				groups[group_idx][1].append(oid)
+				break
 		else:
-			print(type(geo))
-			raise Exception("错误的文件几何类型")
-		cursor.updateRow(row)
-	del row,cursor
+			buckets.setdefault(key,[]).append(len(groups))
+			groups.append((geo,[oid]))
+	return groups
 
+#返回重复几何的OID分组，如[[3,17],[5,8,9]]
+def duplicate_groups(dataset,grid_size=None):
+	return [oids for geo,oids in __geometry_groups(dataset,grid_size) if len(oids)>1]
 
-def ContainsRecorder(iden_dataset,region_dataset,record_field):
-	regions=[]
-	for row in arcpy.da.SearchCursor(region_dataset,["FID","SHAPE@"]):
-		regions.append(row)
-	del row
-	#print(regions)
-	cursor=arcpy.da.UpdateCursor(iden_dataset,["SHAPE@",record_field.decode("utf8")])
-	for row in cursor:
-		comma=','
-		for region in regions:
-			if region[1].contains(row[0]):
-				comma+=str(region[0])+','
-				#print(region[0])
-		#if comma[0]==',':
-		#	comma=comma[1:]
-		row[1]=comma
-		cursor.updateRow(row)
-	del row,cursor
-
-def unique(dataset,path,out_name):
-	shps=[]
+#去除重复几何后输出到path/out_name，返回重复几何的OID分组
+def unique(dataset,path,out_name,grid_size=None):
 	sr=arcpy.Describe(dataset).SpatialReference.ExportToString()
 	st=arcpy.Describe(dataset).shapetype
 	arcpy.management.CreateFeatureclass(path,out_name,st,spatial_reference=sr)
-	cur1=arcpy.da.SearchCursor(dataset,["SHAPE@"])
-	for row in cur1:
-		if len(filter(lambda x:x==row[0],shps))==0:
-			shps.append(row[0])
-	del cur1
-	#这个方法感觉还是太慢了
+	groups=__geometry_groups(dataset,grid_size)
 	cur2=arcpy.da.InsertCursor(path+"/"+out_name,["SHAPE@"])
-	for row in shps:
-		cur2.insertRow([row])
+	for geo,oids in groups:
+		cur2.insertRow([geo])
 	del cur2
+	return [oids for geo,oids in groups if len(oids)>1]
 
-def check_unique(dataset):
-	shps=ct_fea.to_list(dataset)
-	count=len(shps)
-	for ii in range(count):
-		for jj in range(count):
-			if ii==jj:
-				continue
-			if shps[ii].equals(shps[jj]):
-				return(shps[ii])
+#返回第一个有重复的几何，没有重复时返回None
+def check_unique(dataset,grid_size=None):
+	for geo,oids in __geometry_groups(dataset,grid_size):
+		if len(oids)>1:
+			return(geo)
 	return(None)
 
 
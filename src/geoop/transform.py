@@ -2,114 +2,104 @@
 # 平移、缩放、旋转等连续性变换
 
 import arcpy
+import json
+import math
+import numpy
 
 
 #issubclass(arcpy.geometries.PointGeometry,arcpy.geometries.Geometry)
 
 
+#组合仿射变换矩阵(3×3，作用于列向量[x,y,1])：以origin为原点依次缩放、错切、逆时针旋转rotate弧度，再平移translate
+#scale和shear可以是数值或(x,y)二元组
+#affine_matrix(translate=(100,0),rotate=math.pi/2,origin=(500000,3000000))
+def affine_matrix(translate=(0,0),scale=(1,1),rotate=0.0,shear=(0,0),origin=(0,0)):
+	if not hasattr(scale,"__len__"):
+		scale=(scale,scale)
+	if not hasattr(shear,"__len__"):
+		shear=(shear,shear)
+	to_origin=numpy.array([[1,0,-origin[0]],[0,1,-origin[1]],[0,0,1]],dtype=numpy.float64)
+	scaling_matrix=numpy.array([[scale[0],0,0],[0,scale[1],0],[0,0,1]],dtype=numpy.float64)
+	shear_matrix=numpy.array([[1,shear[0],0],[shear[1],1,0],[0,0,1]],dtype=numpy.float64)
+	cos,sin=math.cos(rotate),math.sin(rotate)
+	rotate_matrix=numpy.array([[cos,-sin,0],[sin,cos,0],[0,0,1]],dtype=numpy.float64)
+	back=numpy.array([[1,0,origin[0]+translate[0]],[0,1,origin[1]+translate[1]],[0,0,1]],dtype=numpy.float64)
+	return back.dot(rotate_matrix).dot(shear_matrix).dot(scaling_matrix).dot(to_origin)
+
+#esri JSON中全部坐标的列表(与JSON共享，可原地修改)，点几何为None
+#含曲线的几何变换圆弧和贝塞尔曲线的控制点，圆弧只在相似变换下保持精确
+def _json_coords_(geo_json):
+	if "x" in geo_json:
+		return None
+	coords=list(geo_json.get("points",[]))
+	for key in ["rings","paths","curveRings","curvePaths"]:
+		for part in geo_json.get(key,[]):
+			for item in part:
+				if type(item)==dict:
+					if "a" in item:
+						raise Exception("不支持含椭圆弧的几何")
+					for value in item.values():
+						coords.extend(value)
+				else:
+					coords.append(item)
+	return coords
+
+#对一组esri JSON字符串做仿射变换，所有折点合并为一个数组做一次矩阵乘法，返回变换后的JSON字典列表(空几何为None)
+def _affine_json_(json_strings,matrix):
+	results=[]
+	coords=[]
+	points=[]
+	for text in json_strings:
+		if text==None:
+			results.append(None)
+			continue
+		geo_json=json.loads(text)
+		part_coords=_json_coords_(geo_json)
+		if part_coords==None:
+			if geo_json["x"]!=None and geo_json["x"]!="NaN":
+				coords.append([geo_json["x"],geo_json["y"]])
+				points.append((geo_json,coords[-1]))
+		else:
+			coords.extend(part_coords)
+		results.append(geo_json)
+	if len(coords)==0:
+		return results
+	xy1=numpy.ones((len(coords),3),dtype=numpy.float64)
+	xy1[:,0:2]=[c[0:2] for c in coords]
+	new_xy=xy1.dot(numpy.asarray(matrix,dtype=numpy.float64).T)[:,0:2].tolist()
+	for c,xy in zip(coords,new_xy):
+		c[0]=xy[0]
+		c[1]=xy[1]
+	for geo_json,c in points:
+		geo_json["x"]=c[0]
+		geo_json["y"]=c[1]
+	return results
+
+#对几何对象列表做仿射变换，保留多部分、内环以及Z、M值，返回新的几何对象列表
+#affine_geometries(shapes,affine_matrix(scale=2,origin=(shapes[0].centroid.X,shapes[0].centroid.Y)))
+def affine_geometries(geometries,matrix):
+	results=_affine_json_([None if geo==None else geo.JSON for geo in geometries],matrix)
+	return [None if x==None else arcpy.AsShape(x,True) for x in results]
+
+#对数据集的全部几何做仿射变换并写回，按SHAPE@JSON一次读取、一次矩阵乘法、一次写回
+#affine_dataset("地块",affine_matrix(rotate=math.pi/6,origin=(500000,3000000)))
+def affine_dataset(dataset,matrix):
+	json_strings=[row[0] for row in arcpy.da.SearchCursor(dataset,["SHAPE@JSON"])]
+	results=_affine_json_(json_strings,matrix)
+	cursor=arcpy.da.UpdateCursor(dataset,["SHAPE@"])
+	idx=0
+	for row in cursor:
+		if results[idx]!=None:
+			cursor.updateRow([arcpy.AsShape(results[idx],True)])
+		idx+=1
+	del cursor
+
 def translation(geo,offset):
 	if not issubclass(geo.__class__,arcpy.Geometry):
 		raise Exception("geo必须是arcpy.Geometry类")
-	x_offset=offset[0]
-	y_offset=offset[1]
-	if type(geo) == arcpy.geometries.PointGeometry:
-		ptr=geo.firstPoint
-		ptr.X+=x_offset
-		ptr.Y+=y_offset
-		return(arcpy.geometries.PointGeometry(ptr))
-	elif type(geo) == arcpy.geometries.Polyline:
-		arr=geo.getPart()[0]
-		for i in arr:
-			i.X+=x_offset
-			i.Y+=y_offset
-		return(arcpy.Polyline(arcpy.Array(arr)))
-	elif type(geo) == arcpy.geometries.Polygon:
-		arr=geo.getPart()
-		for i in arr:
-			for j in i:
-				j.X+=x_offset
-				j.Y+=y_offset
-		return(arcpy.Polygon(arcpy.Array(arr)))
-	else:
-		print(type(geo))
-		raise Exception("错误的文件几何类型")
+	return affine_geometries([geo],affine_matrix(translate=offset))[0]
 
 def scaling(geo,offset,origin=[0,0]):
-	x_times=offset[0]
-	y_times=offset[1]
-	x_origin=origin[0]
-	y_origin=origin[1]
-	if type(geo) == arcpy.geometries.PointGeometry:
-		ptr=geo.firstPoint
-		ptr.X-=x_origin
-		ptr.Y-=y_origin
-		ptr.X*=x_times
-		ptr.Y*=y_times
-		ptr.X+=x_origin
-		ptr.Y+=y_origin
-		return(arcpy.geometries.PointGeometry(ptr))
-	elif type(geo) == arcpy.geometries.Polyline:
-		arr=geo.getPart()[0]
-		for i in arr:
-			i.X-=x_origin
-			i.Y-=y_origin
-			i.X*=x_times
-			i.Y*=y_times
-			i.X+=x_origin
-			i.Y+=y_origin
-		return(arcpy.Polyline(arcpy.Array(arr)))
-	elif type(geo) == arcpy.geometries.Polygon:
-		arr=geo.getPart()
-		new_parts = []
-		for i in arr:
-			new_vertices = []
-			for j in i:
-				v=j
-				v.X -= x_origin
-				v.Y -= y_origin
-				v.X *= x_times
-				v.Y *= y_times
-				v.X += x_origin
-				v.Y += y_origin
-				new_vertices.append(v)
-			new_parts.append(new_vertices)
-		return(arcpy.Polygon(arcpy.Array(new_parts)))
-	else:
-		print(type(geo))
-		raise Exception("错误的文件几何类型")
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+	if not issubclass(geo.__class__,arcpy.Geometry):
+		raise Exception("geo必须是arcpy.Geometry类")
+	return affine_geometries([geo],affine_matrix(scale=offset,origin=origin))[0]
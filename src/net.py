@@ -4,7 +4,19 @@ import arcpy.sa
 import arcpy.da
 import os
 import os.path
+import numpy
 import scipy.spatial
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.spatial.distance
+import scipy.stats
+import tempfile
+import multiprocessing
+import multiprocessing.pool
+import sys
+import heapq
+import collections
+import math
 
 
 #Adjacent2GeoNetwork(0,0,"F:/temp/test.txt",0)
@@ -19,157 +31,487 @@ def list_select(list,key):
 			tmp_list.pop(index)
 	return tmp_list
 
-#criterion为匿名函数
-#Adjacent2GeoNetwork("HouseJC","社群",'f:/temp/szk.txt',"inner_net_300",300,lambda x,y:x.find(str(y))>=0)
-#Adjacent2GeoNetwork("vills_prj_market","markets",list(numpy.identity(812)),"market_edges",0,lambda x,y:x.find(","+str(y)+",")>=0)
-def Adjacent2GeoNetwork(nodes,id_field,adjacent_matrix,output_edges,max_dist=0,criterion=lambda x,y:x==y,in_memory=True):
-	if type(adjacent_matrix)==str or type(adjacent_matrix)==unicode:
-		#读取邻接矩阵txt文件
-		mat_f = open(adjacent_matrix, "r+")
-		mat_str = mat_f.read()
-		mat_res=[]
-		for ii in mat_str.split("\n"):
-			mat_res.append(ii.split(","))
-		mat_f.close()
-		max_rows=len(mat_res)
+#读取点要素坐标，返回n×2的numpy数组
+def __node_xy(nodes,spatial_reference=None):
+	arr = arcpy.da.FeatureClassToNumPyArray(nodes,["SHAPE@X","SHAPE@Y"],spatial_reference=spatial_reference)
+	xy = numpy.empty((len(arr),2),dtype=numpy.float64)
+	xy[:,0] = arr["SHAPE@X"]
+	xy[:,1] = arr["SHAPE@Y"]
+	return xy
+
+#新建边线要素类，fields为[(字段名,字段类型),...]，返回要素类路径
+def __new_edge_dataset(output_edges,fields,spatial_reference=None,in_memory=True):
+	if in_memory:
+		feature_class=arcpy.management.CreateFeatureclass("in_memory", output_edges, "POLYLINE",spatial_reference=spatial_reference)[0]
 	else:
-		if type(adjacent_matrix)==list:
-			mat_res=adjacent_matrix[:]
+		fs=os.path.split(output_edges)
+		feature_class=arcpy.management.CreateFeatureclass(fs[0], fs[1], "POLYLINE",spatial_reference=spatial_reference)[0]
+	for field_name,field_type in fields:
+		arcpy.management.AddField(feature_class, field_name, field_type)
+	return feature_class
+
+#用同一个InsertCursor批量写入边线，xy_1和xy_2为n×2坐标数组，columns为与fields对应的各列数组
+def __insert_edges(feature_class,fields,xy_1,xy_2,columns,spatial_reference=None):
+	columns = [numpy.asarray(x).tolist() for x in columns]
+	x1,y1 = xy_1[:,0].tolist(),xy_1[:,1].tolist()
+	x2,y2 = xy_2[:,0].tolist(),xy_2[:,1].tolist()
+	pi = arcpy.Point()
+	pj = arcpy.Point()
+	cursor = arcpy.da.InsertCursor(feature_class, ["SHAPE@"]+fields)
+	for k in range(len(x1)):
+		pi.X,pi.Y = x1[k],y1[k]
+		pj.X,pj.Y = x2[k],y2[k]
+		polyline = arcpy.Polyline(arcpy.Array([pi,pj]),spatial_reference)
+		cursor.insertRow([polyline]+[col[k] for col in columns])
+	del cursor
+
+#输出边线，out_format="FEATURE"时写入要素类，"EDGES.NPZ"时保存为numpy的npz文件，返回输出路径
+#npz文件中节点坐标只保存一次，边以节点序号edge_1、edge_2表示，各字段保存为同名数组，可用read_edges、load_edges读取
+def __output_edges(output_edges,fields,positions,ii,jj,columns,spatial_reference=None,in_memory=True,out_format="FEATURE"):
+	out_format=out_format.upper()
+	if out_format=="FEATURE":
+		feature_class=__new_edge_dataset(output_edges,fields,spatial_reference,in_memory)
+		__insert_edges(feature_class,[x[0] for x in fields],positions[ii],positions[jj],columns,spatial_reference)
+		return feature_class
+	elif out_format in ["EDGES.NPZ","NPZ"]:
+		if not output_edges.lower().endswith(".npz"):
+			output_edges+=".npz"
+		arrays={}
+		for (field_name,field_type),column in zip(fields,columns):
+			arrays["field_"+field_name]=numpy.asarray(column)
+		sr="" if spatial_reference==None else spatial_reference.exportToString()
+		numpy.savez_compressed(output_edges,node_xy=positions,edge_1=numpy.asarray(ii),edge_2=numpy.asarray(jj),
+			field_names=numpy.array([x[0] for x in fields]),field_types=numpy.array([x[1] for x in fields]),
+			spatial_reference=numpy.array(sr),**arrays)
+		return output_edges
+	else:
+		raise Exception("无效的输出格式："+out_format)
+
+#读取EDGES.NPZ格式的边线，返回(节点坐标,edge_1,edge_2,[(字段名,字段类型),...],{字段名:数组},空间参考字符串)
+def read_edges(edges_npz):
+	try:
+		data=numpy.load(edges_npz,allow_pickle=True)
+	except TypeError:
+		#旧版本numpy没有allow_pickle参数
+		data=numpy.load(edges_npz)
+	fields=list(zip(data["field_names"].tolist(),data["field_types"].tolist()))
+	columns=dict([(name,data["field_"+name]) for name,field_type in fields])
+	res=(data["node_xy"],data["edge_1"],data["edge_2"],fields,columns,data["spatial_reference"].tolist())
+	data.close()
+	return res
+
+#将EDGES.NPZ格式边线中的一部分转为要素类，只在需要显示时生成折线
+#extent为arcpy.Extent或(XMin,YMin,XMax,YMax)，保留外接矩形与之相交的边
+#min_weight、max_weight按weight_field筛选，weight_field为None时依次使用weight、length、cost字段
+#key(columns)返回布尔数组作为自定义筛选条件，columns为{字段名:数组}
+#load_edges("F:/temp/vills_300.npz","vills_300_part",extent=(500000,3800000,510000,3810000),min_weight=100)
+def load_edges(edges_npz,output_edges,extent=None,min_weight=None,max_weight=None,weight_field=None,key=None,in_memory=True):
+	positions,ii,jj,fields,columns,sr_string=read_edges(edges_npz)
+	mask=numpy.ones(len(ii),dtype=bool)
+	if extent!=None:
+		if isinstance(extent,arcpy.Extent):
+			extent=(extent.XMin,extent.YMin,extent.XMax,extent.YMax)
+		x1,y1=positions[ii,0],positions[ii,1]
+		x2,y2=positions[jj,0],positions[jj,1]
+		mask&=(numpy.maximum(x1,x2)>=extent[0])&(numpy.minimum(x1,x2)<=extent[2])
+		mask&=(numpy.maximum(y1,y2)>=extent[1])&(numpy.minimum(y1,y2)<=extent[3])
+	if min_weight!=None or max_weight!=None:
+		if weight_field==None:
+			for name in ["weight","length","cost"]:
+				if name in columns:
+					weight_field=name
+					break
+		if weight_field==None:
+			raise Exception("找不到权重字段")
+		if min_weight!=None:
+			mask&=columns[weight_field]>=min_weight
+		if max_weight!=None:
+			mask&=columns[weight_field]<=max_weight
+	if key!=None:
+		mask&=numpy.asarray(key(columns),dtype=bool)
+	sr=None
+	if sr_string!="":
+		sr=arcpy.SpatialReference()
+		sr.loadFromString(sr_string)
+	return __output_edges(output_edges,fields,positions,ii[mask],jj[mask],[columns[x[0]][mask] for x in fields],sr,in_memory)
+
+#返回距离不超过max_dist的点对(i<j)，max_dist为0时返回全部点对
+def __pairs_within(xy,max_dist):
+	points_count = len(xy)
+	if max_dist==0:
+		ii,jj = numpy.triu_indices(points_count,1)
+		return ii,jj
+	tree = scipy.spatial.cKDTree(xy)
+	try:
+		pairs = tree.query_pairs(max_dist,output_type="ndarray")
+	except TypeError:
+		#旧版本scipy没有output_type参数
+		pairs = numpy.array(sorted(tree.query_pairs(max_dist)),dtype=numpy.intp).reshape(-1,2)
+	return pairs[:,0],pairs[:,1]
+
+#读取邻接矩阵，统一转换为scipy.sparse的COO矩阵，只保留非零元素
+#adjacent_matrix可以是scipy.sparse矩阵、numpy数组、列表或文件路径
+#文件格式matrix_format："NPZ"为scipy.sparse.save_npz保存的文件，"DENSE"为逗号分隔的稠密矩阵txt，"COO"为每行"i,j,weight"的边表txt
+#matrix_format为None时根据扩展名判断，.npz按NPZ读取，其余按DENSE读取
+def __load_adjacent(adjacent_matrix,matrix_format=None):
+	if scipy.sparse.issparse(adjacent_matrix):
+		mat=adjacent_matrix.tocoo()
+	elif type(adjacent_matrix)==str or type(adjacent_matrix)==unicode:
+		if matrix_format==None:
+			matrix_format="NPZ" if adjacent_matrix.lower().endswith(".npz") else "DENSE"
+		matrix_format=matrix_format.upper()
+		if matrix_format=="NPZ":
+			mat=scipy.sparse.load_npz(adjacent_matrix).tocoo()
+		elif matrix_format=="COO":
+			edges=numpy.loadtxt(adjacent_matrix,delimiter=",",ndmin=2)
+			if edges.size==0:
+				return scipy.sparse.coo_matrix((0,0))
+			rows=edges[:,0].astype(numpy.intp)
+			cols=edges[:,1].astype(numpy.intp)
+			data=edges[:,2] if edges.shape[1]>=3 else numpy.ones(len(edges))
+			mat=scipy.sparse.coo_matrix((data,(rows,cols)),shape=(rows.max()+1,cols.max()+1))
+		elif matrix_format=="DENSE":
+			dense=numpy.atleast_2d(numpy.genfromtxt(adjacent_matrix,delimiter=",",dtype=numpy.float64))
+			dense[numpy.isnan(dense)]=0 #行末多余的逗号和空值
+			mat=scipy.sparse.coo_matrix(dense)
 		else:
-			raise Exception("adjacent_matrix参数必须是列表。")
+			raise Exception("无效的矩阵文件格式："+matrix_format)
+	elif type(adjacent_matrix)==list or type(adjacent_matrix)==numpy.ndarray:
+		mat=scipy.sparse.coo_matrix(numpy.array(adjacent_matrix,dtype=numpy.float64))
+	else:
+		raise Exception("adjacent_matrix参数必须是列表、numpy数组、scipy.sparse矩阵或文件路径。")
+	nonzero=mat.data!=0
+	return scipy.sparse.coo_matrix((mat.data[nonzero],(mat.row[nonzero],mat.col[nonzero])),shape=mat.shape)
+
+#节点ID归一化为矩阵序号：整数值的数值或文本(如3.0、"3")转为int，其余原样返回
+def __matrix_key(value):
+	try:
+		number=float(value)
+		if number==int(number):
+			return int(number)
+	except (TypeError,ValueError,OverflowError):
+		pass
+	return value
+
+#criterion为匿名函数，为None时表示id_field的值(归一化为整数)等于矩阵序号，此时用哈希索引查找节点
+#Adjacent2GeoNetwork("HouseJC","社群",'f:/temp/szk.txt',"inner_net_300",300,lambda x,y:x.find(str(y))>=0)
+#Adjacent2GeoNetwork("vills_prj_market","markets",list(numpy.identity(812)),"market_edges",0,lambda x,y:x.find(","+str(y)+",")>=0)
+#Adjacent2GeoNetwork("vills_prj_market","OBJECTID",list(numpy.identity(812)),"market_edges",0,lambda x,y:y in index.get(x,()))，其中index=attr.ContainsDicter(ContainsRecorder输出的关联表)
+#Adjacent2GeoNetwork("vills_prj","vid","F:/temp/market.npz","market_edges")
+def Adjacent2GeoNetwork(nodes,id_field,adjacent_matrix,output_edges,max_dist=0,criterion=None,in_memory=True,matrix_format=None,out_format="FEATURE"):
+	mat=__load_adjacent(adjacent_matrix,matrix_format)
 	
-	#获取节点坐标，保存在列表中
-	positions=[]
+	#获取节点坐标，保存在数组中
+	sr=arcpy.Describe(nodes).SpatialReference
+	ids=[]
+	xy=[]
 	for row in arcpy.da.SearchCursor(nodes,[id_field,"SHAPE@XY"]):
-		positions.append(row)
-	del row
+		ids.append(row[0])
+		xy.append(row[1])
+	positions=numpy.array(xy,dtype=numpy.float64).reshape(-1,2)
 	
-	#新建网络output_edges
-	if in_memory:
-		feature_class=arcpy.CreateFeatureclass_management("in_memory", output_edges, "POLYLINE")[0]
+	#矩阵序号→节点位置的索引，只对非零元素涉及的序号建立
+	if criterion==None:
+		index={}
+		for pos in range(len(ids)):
+			index.setdefault(__matrix_key(ids[pos]),[]).append(pos)
 	else:
-		fs=os.path.split(output_edges)
-		feature_class=arcpy.CreateFeatureclass_management(fs[0], fs[1], "POLYLINE")[0]
-	
-	arcpy.AddField_management(output_edges, "weight", "DOUBLE")
-	arcpy.AddField_management(output_edges, "node_1", "LONG")
-	arcpy.AddField_management(output_edges, "node_2", "LONG")
-	print("adjacent matrix=\n{}".format([mat_res]))
+		index={}
+		for key in numpy.union1d(mat.row,mat.col).tolist():
+			index[key]=[pos for pos in range(len(ids)) if criterion(ids[pos],key)]
+	empty=numpy.zeros(0,dtype=numpy.intp)
+	index=dict([(k,numpy.array(v,dtype=numpy.intp)) for k,v in index.items()])
 	
-	#绘制边线
-	for i in range(0,len(mat_res)):
-		mat_row=mat_res[i]
-		pis=list_select(positions,lambda x:criterion(x[0],i))
-		for j in range(0,len(mat_row)):
-			if mat_row[j]==0:
-				#print("skip")
-				continue
-			pjs=list_select(positions,lambda x:criterion(x[0],j))
-			for pix in pis:
-				for pjx in pjs:
-					pi=pix[1]
-					pj=pjx[1]
-					_from=arcpy.Point(pi[0],pi[1])
-					_to=arcpy.Point(pj[0],pj[1])
-					arr = arcpy.Array([_from,_to])
-					polyline = arcpy.Polyline(arr)
-					if max_dist==0 or polyline.length<=max_dist:
-						cursor = arcpy.da.InsertCursor(output_edges, ["SHAPE@","weight","node_1","node_2"])
-						cursor.insertRow([polyline,mat_row[j],i,j])
-
-
-def GenGeoNetworkByLength(nodes,output_edges,max_dist,in_memory=True):
-
-	#获取节点坐标，保存在列表中
-	positions=[]
-	for row in arcpy.da.SearchCursor(nodes,["SHAPE@XY"]):
-		positions.append(row[0])
-	del row
+	#只遍历非零元素，展开两端匹配节点的笛卡尔积
+	pi_list,pj_list,w_list,i_list,j_list=[],[],[],[],[]
+	for i,j,w in zip(mat.row.tolist(),mat.col.tolist(),mat.data.tolist()):
+		pis=index.get(i,empty)
+		pjs=index.get(j,empty)
+		if len(pis)==0 or len(pjs)==0:
+			continue
+		pi_list.append(numpy.repeat(pis,len(pjs)))
+		pj_list.append(numpy.tile(pjs,len(pis)))
+		count=len(pis)*len(pjs)
+		w_list.append(numpy.repeat(w,count))
+		i_list.append(numpy.repeat(i,count))
+		j_list.append(numpy.repeat(j,count))
+	if pi_list==[]:
+		pi_list,pj_list,w_list,i_list,j_list=[empty],[empty],[numpy.zeros(0)],[empty],[empty]
+	pi,pj=numpy.concatenate(pi_list),numpy.concatenate(pj_list)
+	weights=numpy.concatenate(w_list)
+	node_1,node_2=numpy.concatenate(i_list),numpy.concatenate(j_list)
+	if max_dist!=0:
+		lengths=numpy.hypot(positions[pj,0]-positions[pi,0],positions[pj,1]-positions[pi,1])
+		valid=lengths<=max_dist
+		pi,pj,weights,node_1,node_2=pi[valid],pj[valid],weights[valid],node_1[valid],node_2[valid]
 	
-	#新建网络output_edges
-	sr=arcpy.Describe(nodes).SpatialReference.ExportToString()
-	if in_memory:
-		feature_class=arcpy.management.CreateFeatureclass("in_memory", output_edges, "POLYLINE",spatial_reference=sr)[0]
-	else:
-		fs=os.path.split(output_edges)
-		feature_class=arcpy.management.CreateFeatureclass(fs[0], fs[1], "POLYLINE",spatial_reference=sr)[0]
+	#新建网络output_edges并批量绘制边线
+	fields=[("weight","DOUBLE"),("node_1","LONG"),("node_2","LONG")]
+	return __output_edges(output_edges,fields,positions,pi,pj,[weights,node_1,node_2],sr,in_memory,out_format)
+
+
+#directed为True时每对节点输出i→j和j→i两条边（与旧版一致），否则每对节点只输出一次
+def GenGeoNetworkByLength(nodes,output_edges,max_dist,in_memory=True,directed=True,out_format="FEATURE"):
+
+	#获取节点坐标，保存在数组中
+	sr=arcpy.Describe(nodes).SpatialReference
+	positions=__node_xy(nodes)
 	
-	arcpy.management.AddField(output_edges, "node_1", "LONG")
-	arcpy.management.AddField(output_edges, "node_2", "LONG")
-	arcpy.management.AddField(output_edges, "length", "DOUBLE")
+	#查找距离阈值内的点对
+	ii,jj=__pairs_within(positions,max_dist)
+	lengths=numpy.hypot(positions[jj,0]-positions[ii,0],positions[jj,1]-positions[ii,1])
+	if max_dist!=0:
+		#cKDTree与Polyline.length的浮点误差可能不同，统一再筛选一次
+		valid=lengths<=max_dist
+		ii,jj,lengths=ii[valid],jj[valid],lengths[valid]
+	if directed:
+		ii,jj=numpy.concatenate([ii,jj]),numpy.concatenate([jj,ii])
+		lengths=numpy.concatenate([lengths,lengths])
 	
-	#绘制边线
-	points_count = len(positions)
-	for i in range(points_count):
-		for j in range(points_count):
-			if i==j:
-				continue
-			pi = arcpy.Point(positions[i][0],positions[i][1])
-			pj = arcpy.Point(positions[j][0],positions[j][1])
-			arr = arcpy.Array([pi,pj])
-			polyline = arcpy.Polyline(arr)
-			plen = polyline.length
-			if max_dist==0 or plen<=max_dist:
-				cursor = arcpy.da.InsertCursor(output_edges, ["SHAPE@","node_1","node_2","length"])
-				cursor.insertRow([polyline,i,j,plen])
+	#新建网络output_edges并批量绘制边线
+	fields=[("node_1","LONG"),("node_2","LONG"),("length","DOUBLE")]
+	return __output_edges(output_edges,fields,positions,ii,jj,[ii,jj,lengths],sr,in_memory,out_format)
 
-def GenGeoNetworkByValue(nodes,output_edges,valfield,in_memory=True):
+#Delaunay三角剖分，共线等退化情况下抖动输入
+def __triangulate(xy):
+	try:
+		return scipy.spatial.Delaunay(xy)
+	except Exception:
+		return scipy.spatial.Delaunay(xy,qhull_options="QJ")
 
-	#获取节点坐标，保存在列表中
-	positions=[]
-	for row in arcpy.da.SearchCursor(nodes,["SHAPE@XY",valfield]):
-		positions.append(row[0:2])
-	del row
-	
-	#新建网络output_edges
-	sr=arcpy.Describe(nodes).SpatialReference.ExportToString()
-	if in_memory:
-		feature_class=arcpy.management.CreateFeatureclass("in_memory", output_edges, "POLYLINE",spatial_reference=sr)[0]
-	else:
-		fs=os.path.split(output_edges)
-		feature_class=arcpy.management.CreateFeatureclass(fs[0], fs[1], "POLYLINE",spatial_reference=sr)[0]
+#由simplices和neighbors得到无重复的三角网边(i<j)及两侧三角形序号，凸包上的边另一侧为-1
+def __delaunay_edge_table(dly):
+	simp = dly.simplices
+	nbrs = dly.neighbors
+	tri  = numpy.arange(len(simp))
+	ii_list,jj_list,f1_list,f2_list = [],[],[],[]
+	for k in range(3):
+		#第k条边与第k个顶点相对，相邻三角形序号较小(或无相邻三角形)时输出，保证每条边只出现一次
+		mask = nbrs[:,k]<tri
+		ii_list.append(simp[mask,(k+1)%3])
+		jj_list.append(simp[mask,(k+2)%3])
+		f1_list.append(tri[mask])
+		f2_list.append(nbrs[mask,k])
+	ii = numpy.concatenate(ii_list)
+	jj = numpy.concatenate(jj_list)
+	return numpy.minimum(ii,jj),numpy.maximum(ii,jj),numpy.concatenate(f1_list),numpy.concatenate(f2_list)
+
+#返回Delaunay三角网的无重复边(i<j)，与重合点相连的边一并返回
+def __delaunay_edges(xy):
+	points_count = len(xy)
+	if points_count<3:
+		ii,jj = numpy.triu_indices(points_count,1)
+		return ii,jj
+	dly = __triangulate(xy)
+	ii,jj,f1,f2 = __delaunay_edge_table(dly)
+	#重合点不参与三角剖分，连接到最近的顶点
+	if len(dly.coplanar)>0:
+		ii = numpy.concatenate([ii,numpy.minimum(dly.coplanar[:,0],dly.coplanar[:,2])])
+		jj = numpy.concatenate([jj,numpy.maximum(dly.coplanar[:,0],dly.coplanar[:,2])])
+	return ii,jj
+
+#欧氏最小生成树，在Delaunay边上计算
+def __emst_pairs(xy):
+	points_count = len(xy)
+	if points_count<2:
+		return numpy.zeros(0,dtype=numpy.intp),numpy.zeros(0,dtype=numpy.intp)
+	ii,jj = __delaunay_edges(xy)
+	lengths = numpy.hypot(xy[jj,0]-xy[ii,0],xy[jj,1]-xy[ii,1])
+	#csgraph将0视为无边，重合点之间的边给一个极小的长度
+	lengths[lengths==0] = numpy.finfo(numpy.float64).tiny
+	graph = scipy.sparse.coo_matrix((lengths,(ii,jj)),shape=(points_count,points_count))
+	mst = scipy.sparse.csgraph.minimum_spanning_tree(graph).tocoo()
+	return mst.row.astype(numpy.intp),mst.col.astype(numpy.intp)
+
+#按valfield字段值分组，只在组内连线
+#mode="CLIQUE"组内两两相连（与旧版一致），"STAR"组内节点连接到距组重心最近的中心节点，"MST"组内欧氏最小生成树
+#directed为True时每对节点输出两个方向的边
+def GenGeoNetworkByValue(nodes,output_edges,valfield,in_memory=True,mode="CLIQUE",directed=True,out_format="FEATURE"):
 	fs=list(filter(lambda x:x.name==valfield,arcpy.Describe(nodes).fields))
 	if fs==[]:
 		raise Exception("找不到字段"+valfield)
 	else:
 		fieldtype=fs[0].type
+	mode=mode.upper()
+	if not mode in ["CLIQUE","STAR","MST"]:
+		raise Exception("无效的连线方式："+mode)
+	
+	#获取节点坐标，一次遍历完成分组
+	sr=arcpy.Describe(nodes).SpatialReference
+	xy=[]
+	values=[]
+	groups={}
+	for row in arcpy.da.SearchCursor(nodes,["SHAPE@XY",valfield]):
+		groups.setdefault(row[1],[]).append(len(xy))
+		xy.append(row[0])
+		values.append(row[1])
+	positions=numpy.array(xy,dtype=numpy.float64).reshape(-1,2)
 	
+	#逐组生成边
+	ii_list=[numpy.zeros(0,dtype=numpy.intp)]
+	jj_list=[numpy.zeros(0,dtype=numpy.intp)]
+	for members in groups.values():
+		members=numpy.array(members,dtype=numpy.intp)
+		count=len(members)
+		if count<2:
+			continue
+		if mode=="CLIQUE":
+			ii,jj=numpy.triu_indices(count,1)
+		elif mode=="STAR":
+			pts=positions[members]
+			center=numpy.argmin(((pts-pts.mean(axis=0))**2).sum(axis=1))
+			jj=numpy.delete(numpy.arange(count),center)
+			ii=numpy.repeat(center,count-1)
+		else:
+			ii,jj=__emst_pairs(positions[members])
+		ii_list.append(members[ii])
+		jj_list.append(members[jj])
+	ii=numpy.concatenate(ii_list)
+	jj=numpy.concatenate(jj_list)
+	if directed:
+		ii,jj=numpy.concatenate([ii,jj]),numpy.concatenate([jj,ii])
+	vals=[values[i] for i in ii.tolist()]
 	
-	arcpy.management.AddField(output_edges, "node_1", "LONG")
-	arcpy.management.AddField(output_edges, "node_2", "LONG")
-	arcpy.management.AddField(output_edges, valfield, fieldtype)
+	#新建网络output_edges并批量绘制边线
+	fields=[("node_1","LONG"),("node_2","LONG"),(valfield,fieldtype)]
+	return __output_edges(output_edges,fields,positions,ii,jj,[ii,jj,vals],sr,in_memory,out_format)
+
+
+#每个节点连接到最近的k个节点，directed为True时输出i→j(j为i的近邻)，否则合并为无重复的无向边
+def GenGeoNetworkByKNN(nodes,output_edges,k,in_memory=True,directed=True,out_format="FEATURE"):
+	sr=arcpy.Describe(nodes).SpatialReference
+	positions=__node_xy(nodes)
+	points_count=len(positions)
+	kk=min(k,points_count-1)
+	if kk>0:
+		tree=scipy.spatial.cKDTree(positions)
+		lengths,near=tree.query(positions,kk+1)
+		lengths,near=lengths.reshape(points_count,-1),near.reshape(points_count,-1)
+		#去掉节点自身；有重合点时自身不一定排在第一位，此时去掉最远的一个
+		is_self=near==numpy.arange(points_count)[:,None]
+		is_self[~is_self.any(axis=1),-1]=True
+		ii=numpy.repeat(numpy.arange(points_count),kk)
+		jj=near[~is_self]
+		lengths=lengths[~is_self]
+	else:
+		ii=jj=numpy.zeros(0,dtype=numpy.intp)
+		lengths=numpy.zeros(0)
+	if not directed:
+		pairs=numpy.unique(numpy.minimum(ii,jj).astype(numpy.int64)*points_count+numpy.maximum(ii,jj))
+		ii,jj=(pairs//points_count).astype(numpy.intp),(pairs%points_count).astype(numpy.intp)
+		lengths=numpy.hypot(positions[jj,0]-positions[ii,0],positions[jj,1]-positions[ii,1])
 	
-	#绘制边线
-	points_count = len(positions)
-	for i in range(points_count):
-		for j in range(points_count):
-			if i==j or positions[i][1]<>positions[j][1]:
-				continue
-			pi = arcpy.Point(positions[i][0][0],positions[i][0][1])
-			pj = arcpy.Point(positions[j][0][0],positions[j][0][1])
-			val = positions[i][1]
-			arr = arcpy.Array([pi,pj])
-			polyline = arcpy.Polyline(arr)
-			cursor = arcpy.da.InsertCursor(output_edges, ["SHAPE@","node_1","node_2",valfield])
-			cursor.insertRow([polyline,i,j,val])
+	fields=[("node_1","LONG"),("node_2","LONG"),("length","DOUBLE")]
+	return __output_edges(output_edges,fields,positions,ii,jj,[ii,jj,lengths],sr,in_memory,out_format)
+
+#Gabriel图：以边为直径的圆内没有其他节点，Delaunay边的子集
+def __gabriel_pairs(xy,ii,jj,tree):
+	mids=(xy[ii]+xy[jj])/2.0
+	radius=numpy.hypot(xy[jj,0]-xy[ii,0],xy[jj,1]-xy[ii,1])/2.0
+	nearest,_=tree.query(mids,1)
+	keep=nearest>=radius*(1-1e-9)
+	return ii[keep],jj[keep]
+
+#相对邻域图：不存在到两端点距离都小于边长的节点，Gabriel边的子集
+def __rng_pairs(xy,ii,jj,tree):
+	mids=(xy[ii]+xy[jj])/2.0
+	lengths=numpy.hypot(xy[jj,0]-xy[ii,0],xy[jj,1]-xy[ii,1])
+	keep=numpy.ones(len(ii),dtype=bool)
+	#两圆相交的透镜区域都在以边中点为圆心、边长√3/2为半径的圆内
+	for e in range(len(ii)):
+		cands=numpy.array(tree.query_ball_point(mids[e],lengths[e]*math.sqrt(3)/2.0),dtype=numpy.intp)
+		cands=cands[(cands!=ii[e])&(cands!=jj[e])]
+		if len(cands)==0:
+			continue
+		d1=numpy.hypot(xy[cands,0]-xy[ii[e],0],xy[cands,1]-xy[ii[e],1])
+		d2=numpy.hypot(xy[cands,0]-xy[jj[e],0],xy[cands,1]-xy[jj[e],1])
+		if numpy.any(numpy.maximum(d1,d2)<lengths[e]*(1-1e-9)):
+			keep[e]=False
+	return ii[keep],jj[keep]
 
+#由Delaunay三角网派生的邻近图，graph_type="GABRIEL"为Gabriel图，"RNG"为相对邻域图，"EMST"为欧氏最小生成树
+#directed为True时每对节点输出两个方向的边
+def GenGeoNetworkByProximity(nodes,output_edges,graph_type="GABRIEL",in_memory=True,directed=False,out_format="FEATURE"):
+	graph_type=graph_type.upper()
+	if not graph_type in ["GABRIEL","RNG","EMST"]:
+		raise Exception("无效的邻近图类型："+graph_type)
+	sr=arcpy.Describe(nodes).SpatialReference
+	positions=__node_xy(nodes)
+	if graph_type=="EMST":
+		ii,jj=__emst_pairs(positions)
+	else:
+		ii,jj=__delaunay_edges(positions)
+		tree=scipy.spatial.cKDTree(positions)
+		ii,jj=__gabriel_pairs(positions,ii,jj,tree)
+		if graph_type=="RNG":
+			ii,jj=__rng_pairs(positions,ii,jj,tree)
+	if directed:
+		ii,jj=numpy.concatenate([ii,jj]),numpy.concatenate([jj,ii])
+	lengths=numpy.hypot(positions[jj,0]-positions[ii,0],positions[jj,1]-positions[ii,1])
+	
+	fields=[("node_1","LONG"),("node_2","LONG"),("length","DOUBLE")]
+	return __output_edges(output_edges,fields,positions,ii,jj,[ii,jj,lengths],sr,in_memory,out_format)
 
 
+#读取节点编号、首点坐标(X,Y,Z,M)和属性字段
+def __bipartite_nodes(dataset,id_field,fields):
+	ids=[]
+	xyzm=[]
+	attrs=[]
+	for row in arcpy.da.SearchCursor(dataset,[id_field,"SHAPE@"]+fields):
+		po=row[1].firstPoint
+		ids.append(row[0])
+		xyzm.append((po.X,po.Y,po.Z,po.M))
+		attrs.append(row[2:])
+	return ids,xyzm,attrs
 
-def Bipartite(dataset_1,dataset_2,output_edges,fields_1=[],fields_2=[],criterion=lambda fs1,fs2,pl:True,field_calc=lambda fs1,fs2:0.0,in_memory=True,max_length=None,id_field_1=None,id_field_2=None,calc_field_type="DOUBLE"):
-	#获取节点坐标，保存在列表中
+#按块生成候选点对，max_length不为None时用dataset_2的KD树剪枝
+def __bipartite_candidates(xy_1,xy_2,max_length,block_size):
+	count_1,count_2=len(xy_1),len(xy_2)
+	if count_1==0 or count_2==0:
+		return
+	if max_length==None:
+		step=max(1,block_size//count_2)
+		for start in range(0,count_1,step):
+			stop=min(start+step,count_1)
+			ii=numpy.repeat(numpy.arange(start,stop),count_2)
+			jj=numpy.tile(numpy.arange(count_2),stop-start)
+			yield ii,jj
+	else:
+		tree=scipy.spatial.cKDTree(xy_2)
+		step=1024
+		ii_list,jj_list,size=[],[],0
+		for start in range(0,count_1,step):
+			stop=min(start+step,count_1)
+			hits=tree.query_ball_point(xy_1[start:stop],max_length)
+			for offset,js in enumerate(hits):
+				if len(js)==0:
+					continue
+				ii_list.append(numpy.repeat(start+offset,len(js)))
+				jj_list.append(numpy.array(js,dtype=numpy.intp))
+				size+=len(js)
+			if size>=block_size:
+				yield numpy.concatenate(ii_list),numpy.concatenate(jj_list)
+				ii_list,jj_list,size=[],[],0
+		if size>0:
+			yield numpy.concatenate(ii_list),numpy.concatenate(jj_list)
+
+#vectorized为True时criterion(fs1,fs2,length)和field_calc(fs1,fs2)按块调用，
+#fs1、fs2为各字段在候选点对上的numpy数组元组，length为线段长度数组，criterion返回布尔数组，field_calc返回数值数组
+#Bipartite("facilities","villages","fac_vill",["cap"],["pop"],criterion=lambda fs1,fs2,l:fs2[0]>100,field_calc=lambda fs1,fs2:fs1[0]/fs2[0],max_length=5000,vectorized=True)
+def Bipartite(dataset_1,dataset_2,output_edges,fields_1=[],fields_2=[],criterion=lambda fs1,fs2,pl:True,field_calc=lambda fs1,fs2:0.0,in_memory=True,max_length=None,id_field_1=None,id_field_2=None,calc_field_type="DOUBLE",vectorized=False,block_size=100000):
+	#获取节点坐标，保存在数组中
 	if id_field_1 == None:
 		id_field_1=arcpy.ListFields(dataset_1)[0].name
 	if id_field_2 == None:
 		id_field_2=arcpy.ListFields(dataset_2)[0].name
-	pos_1=[]
-	for row in arcpy.da.SearchCursor(dataset_1,[id_field_1,"SHAPE@"]+fields_1):
-		pos_1.append(row)
-	del row
-	pos_2=[]
-	for row in arcpy.da.SearchCursor(dataset_2,[id_field_2,"SHAPE@"]+fields_2):
-		pos_2.append(row)
-	del row
+	ids_1,xyzm_1,attrs_1=__bipartite_nodes(dataset_1,id_field_1,fields_1)
+	ids_2,xyzm_2,attrs_2=__bipartite_nodes(dataset_2,id_field_2,fields_2)
+	xy_1=numpy.array([x[0:2] for x in xyzm_1],dtype=numpy.float64).reshape(-1,2)
+	xy_2=numpy.array([x[0:2] for x in xyzm_2],dtype=numpy.float64).reshape(-1,2)
+	if vectorized:
+		cols_1=[numpy.array([x[k] for x in attrs_1]) for k in range(len(fields_1))]
+		cols_2=[numpy.array([x[k] for x in attrs_2]) for k in range(len(fields_2))]
 	
 	#新建网络output_edges
 	if in_memory:
@@ -177,69 +519,130 @@ def Bipartite(dataset_1,dataset_2,output_edges,fields_1=[],fields_2=[],criterion
 	else:
 		fs=os.path.split(output_edges)
 		feature_class=arcpy.CreateFeatureclass_management(fs[0], fs[1], "POLYLINE",has_z="ENABLED",has_m="ENABLED")[0]
-	arcpy.AddField_management(output_edges, "length", "DOUBLE")
-	arcpy.AddField_management(output_edges, "node_1", "LONG")
-	arcpy.AddField_management(output_edges, "node_2", "LONG")
-	arcpy.AddField_management(output_edges, "calc", calc_field_type)
+	arcpy.AddField_management(feature_class, "length", "DOUBLE")
+	arcpy.AddField_management(feature_class, "node_1", "LONG")
+	arcpy.AddField_management(feature_class, "node_2", "LONG")
+	arcpy.AddField_management(feature_class, "calc", calc_field_type)
 	
-	for r1 in pos_1:
-		id_1=r1[0]
-		po_1=r1[1].firstPoint
-		for r2 in pos_2:
-			id_2=r2[0]
-			po_2=r2[1].firstPoint
-			_from=arcpy.Point(po_1.X,po_1.Y,po_1.Z,po_1.M)
-			_to=arcpy.Point(po_2.X,po_2.Y,po_2.Z,po_2.M)
-			#print(po_1,po_2)
+	cursor = arcpy.da.InsertCursor(feature_class, ["SHAPE@","length","node_1","node_2","calc"])
+	for ii,jj in __bipartite_candidates(xy_1,xy_2,max_length,block_size):
+		lengths=numpy.hypot(xy_2[jj,0]-xy_1[ii,0],xy_2[jj,1]-xy_1[ii,1])
+		if max_length != None:
+			valid=lengths<=max_length
+			ii,jj,lengths=ii[valid],jj[valid],lengths[valid]
+		if vectorized:
+			fs1=tuple([c[ii] for c in cols_1])
+			fs2=tuple([c[jj] for c in cols_2])
+			valid=numpy.asarray(criterion(fs1,fs2,lengths),dtype=bool)
+			if valid.ndim==0:
+				valid=numpy.repeat(valid,len(ii))
+			ii,jj,lengths=ii[valid],jj[valid],lengths[valid]
+			fs1=tuple([c[valid] for c in fs1])
+			fs2=tuple([c[valid] for c in fs2])
+			calcs=numpy.asarray(field_calc(fs1,fs2))
+			if calcs.ndim==0:
+				calcs=numpy.repeat(calcs,len(ii))
+			calcs=calcs.tolist()
+		for k,(i,j,length) in enumerate(zip(ii.tolist(),jj.tolist(),lengths.tolist())):
+			po_1=xyzm_1[i]
+			po_2=xyzm_2[j]
+			_from=arcpy.Point(*po_1)
+			_to=arcpy.Point(*po_2)
 			arr = arcpy.Array([_from,_to])
 			polyline = arcpy.Polyline(arr)
-			if criterion(r1[2:],r2[2:],polyline):
-				if max_length == None or max_length >= polyline.length:
-					cursor = arcpy.da.InsertCursor(output_edges, ["SHAPE@","length","node_1","node_2","calc"])
-					cursor.insertRow([polyline,polyline.length,id_1,id_2,field_calc(r1[2:],r2[2:])])
+			if vectorized:
+				cursor.insertRow([polyline,length,ids_1[i],ids_2[j],calcs[k]])
+			elif criterion(attrs_1[i],attrs_2[j],polyline):
+				cursor.insertRow([polyline,polyline.length,ids_1[i],ids_2[j],field_calc(attrs_1[i],attrs_2[j])])
+	del cursor
+	return feature_class
+
+#新建属性表，fields为[(字段名,字段类型),...]，返回表路径
+def __new_table(output_table,fields,in_memory=True):
+	if in_memory:
+		table=arcpy.management.CreateTable("in_memory", output_table)[0]
+	else:
+		fs=os.path.split(output_table)
+		table=arcpy.management.CreateTable(fs[0], fs[1])[0]
+	for field_name,field_type in fields:
+		arcpy.management.AddField(table, field_name, field_type)
+	return table
 
-def Delaunay(node_dataset,id_field,out_face_dataset,vertice_type="SET",in_memory=True):
+#vertice_type="SET"时顶点编号以集合字符串记录在vertices字段中（旧格式），"LIST"时按simplices顺序记录在vert_1~vert_3字段中
+#三角形序号记录在face字段中
+#out_edge_dataset不为None时输出无重复的三角网边线，字段为node_1、node_2、length以及两侧三角形face_1、face_2（凸包边为-1）
+#out_neighbor_table不为None时输出三角形邻接表，字段为face_1、face_2
+def Delaunay(node_dataset,id_field,out_face_dataset,vertice_type="SET",in_memory=True,out_edge_dataset=None,out_neighbor_table=None):
 	pts = []
 	ids = []
 	for row in arcpy.da.SearchCursor(node_dataset,["SHAPE@",id_field]):
 		pos = row[0].firstPoint
 		pts.append([pos.X,pos.Y])
 		ids.append(row[1])
-	del row
-	dly = scipy.spatial.Delaunay(pts)
-	polygons = dly.simplices
-	pgs = [arcpy.Polygon(arcpy.Array([arcpy.Point(*pts[x]) for x in simp])) for simp in polygons]
-	idf = [set([ids[x] for x in simp]) for simp in polygons]
+	pts = numpy.array(pts,dtype=numpy.float64).reshape(-1,2)
+	dly = __triangulate(pts)
+	simp = dly.simplices
 	
-	sr = arcpy.Describe(node_dataset).SpatialReference.ExportToString()
+	sr = arcpy.Describe(node_dataset).SpatialReference
 	if in_memory:
 		feature_class = arcpy.management.CreateFeatureclass("in_memory", out_face_dataset, "POLYGON",spatial_reference=sr)[0]
 	else:
 		fs=os.path.split(out_face_dataset)
 		feature_class = arcpy.management.CreateFeatureclass(fs[0], fs[1], "POLYGON",spatial_reference=sr)[0]
-	
+	arcpy.AddField_management(feature_class, "face", "LONG")
 	if vertice_type.lower()=="set":
-		arcpy.AddField_management(out_face_dataset, "vertices", "TEXT", 255)
-		cursor = arcpy.da.InsertCursor(out_face_dataset, ["SHAPE@","vertices"])
-		for index in range(len(pgs)):
-			f = pgs[index]
-			s = idf[index]
-			cursor.insertRow([f,str(s)])
+		arcpy.AddField_management(feature_class, "vertices", "TEXT", 255)
+		vert_fields = ["vertices"]
+		vert_values = [[str(set([ids[x] for x in tri]))] for tri in simp.tolist()]
 	else:
-		arcpy.AddField_management(out_face_dataset, "vert_1", "LONG")
-		arcpy.AddField_management(out_face_dataset, "vert_2", "LONG")
-		arcpy.AddField_management(out_face_dataset, "vert_3", "LONG")
-		cursor = arcpy.da.InsertCursor(out_face_dataset, ["SHAPE@","vert_1","vert_2","vert_3"])
-		for index in range(len(pgs)):
-			f = pgs[index]
-			s = list(idf[index])
-			cursor.insertRow([f]+s)
+		arcpy.AddField_management(feature_class, "vert_1", "LONG")
+		arcpy.AddField_management(feature_class, "vert_2", "LONG")
+		arcpy.AddField_management(feature_class, "vert_3", "LONG")
+		vert_fields = ["vert_1","vert_2","vert_3"]
+		vert_values = [[ids[x] for x in tri] for tri in simp.tolist()]
+	
+	#直接由simplices数组取三角形坐标，用同一个InsertCursor写入
+	tri_xy = pts[simp].tolist()
+	p0,p1,p2 = arcpy.Point(),arcpy.Point(),arcpy.Point()
+	cursor = arcpy.da.InsertCursor(feature_class, ["SHAPE@","face"]+vert_fields)
+	for index in range(len(tri_xy)):
+		c = tri_xy[index]
+		p0.X,p0.Y = c[0]
+		p1.X,p1.Y = c[1]
+		p2.X,p2.Y = c[2]
+		polygon = arcpy.Polygon(arcpy.Array([p0,p1,p2]),sr)
+		cursor.insertRow([polygon,index]+vert_values[index])
+	del cursor
+	
+	if out_edge_dataset!=None or out_neighbor_table!=None:
+		ii,jj,face_1,face_2 = __delaunay_edge_table(dly)
+	if out_edge_dataset!=None:
+		lengths = numpy.hypot(pts[jj,0]-pts[ii,0],pts[jj,1]-pts[ii,1])
+		node_1 = [ids[x] for x in ii.tolist()]
+		node_2 = [ids[x] for x in jj.tolist()]
+		fields = [("node_1","LONG"),("node_2","LONG"),("length","DOUBLE"),("face_1","LONG"),("face_2","LONG")]
+		edge_class = __new_edge_dataset(out_edge_dataset,fields,sr,in_memory)
+		__insert_edges(edge_class,[x[0] for x in fields],pts[ii],pts[jj],[node_1,node_2,lengths,face_1,face_2],sr)
+	if out_neighbor_table!=None:
+		inner = face_2>=0
+		table = __new_table(out_neighbor_table,[("face_1","LONG"),("face_2","LONG")],in_memory)
+		cursor = arcpy.da.InsertCursor(table, ["face_1","face_2"])
+		for row in zip(face_1[inner].tolist(),face_2[inner].tolist()):
+			cursor.insertRow(row)
+		del cursor
+	return feature_class
 
 
 #在Delaunay三角形vertices字段的基础上统计类型
 #class_dict = {1:1, 2:1, 3:2, 4:2, 5:1, 6:3 ... }
 #key默认参数意义：端点值一致时返回1，否则返回0
-def Delaunay_stat(delaunay_dataset,vertices_field,stat_field,class_dict,key=lambda s,d:int(all([d.get(x)==d.get(list(s)[0]) for x in s]))):
+#vertices_field为["vert_1","vert_2","vert_3"]等三个字段且key为None时，不再逐行eval，按numpy数组整体计算端点值是否一致
+def Delaunay_stat(delaunay_dataset,vertices_field,stat_field,class_dict,key=None):
+	if key==None and type(vertices_field) in [list,tuple]:
+		__delaunay_stat_homogeneity(delaunay_dataset,list(vertices_field),stat_field,class_dict)
+		return
+	if key==None:
+		key=lambda s,d:int(all([d.get(x)==d.get(list(s)[0]) for x in s]))
 	cursor = arcpy.da.UpdateCursor(delaunay_dataset,[vertices_field,stat_field])
 	for row in cursor:
 		verts  = eval(row[0])
@@ -247,18 +650,513 @@ def Delaunay_stat(delaunay_dataset,vertices_field,stat_field,class_dict,key=lamb
 		cursor.updateRow(row)
 	del row, cursor
 
+#三个端点的类型是否一致，class_dict中找不到的端点视为同一类
+def __delaunay_stat_homogeneity(delaunay_dataset,vertices_fields,stat_field,class_dict):
+	verts = []
+	for row in arcpy.da.SearchCursor(delaunay_dataset,vertices_fields):
+		verts.append(row)
+	verts = numpy.array(verts).reshape(-1,len(vertices_fields))
+	#类型值编码为整数，节点编号排序后用searchsorted查表
+	class_codes = {}
+	for value in class_dict.values():
+		class_codes.setdefault(value,len(class_codes))
+	keys = numpy.array(list(class_dict.keys()))
+	codes = numpy.array([class_codes[class_dict[x]] for x in keys.tolist()],dtype=numpy.intp)
+	order = numpy.argsort(keys)
+	keys,codes = keys[order],codes[order]
+	if len(keys)==0:
+		classes = numpy.full(verts.shape,-1,dtype=numpy.intp)
+	else:
+		idx = numpy.clip(numpy.searchsorted(keys,verts),0,len(keys)-1)
+		classes = numpy.where(keys[idx]==verts,codes[idx],-1)
+	stat = numpy.all(classes==classes[:,0:1],axis=1).astype(numpy.int32).tolist()
+	cursor = arcpy.da.UpdateCursor(delaunay_dataset,[stat_field])
+	index = 0
+	for row in cursor:
+		if row[0]!=stat[index]:
+			row[0] = stat[index]
+			cursor.updateRow(row)
+		index += 1
+	del cursor
 
 
 
 
-def CostDistPath(nodes,cost_raster,out_edges):
-	arcpy.gp.PathDistance_sa("NetTest/vills_prj","F:/_UrbanPlanning/GIS/ShandongVillages/analyst/pathdis_test.tif","NetTest/slp_pcs.tif","#","#","BINARY 1 45","#","BINARY 1 -30 30","#","#")
-	
-	
-	
-	
+
+#8邻域方向(行偏移,列偏移)，序号即回溯方向编码，与ArcGIS的Backlink相同：0为源，1东、2东南、3南、4西南、5西、6西北、7北、8东北
+__BACKLINK_OFFSETS = [(0,0),(0,1),(1,1),(1,0),(1,-1),(0,-1),(-1,-1),(-1,0),(-1,1)]
+
+#代价栅格的8邻域无向图(CSR)，每对相邻像元只存一条边(东、东南、南、西南)
+#相邻像元间代价为两像元代价均值乘以像元中心距离，零代价改为极小值以免被csgraph视为无边
+def _cost_graph_(cost,cell_width=1.0,cell_height=None):
+	if cell_height==None:
+		cell_height=cell_width
+	rows,cols=cost.shape
+	passable=(~numpy.isnan(cost))&(cost>=0)
+	half=numpy.where(passable,cost,0.0)/2.0
+	index=numpy.arange(rows*cols).reshape(rows,cols)
+	heads,tails,weights=[],[],[]
+	for dr,dc in __BACKLINK_OFFSETS[1:5]:
+		r0,r1=0,rows-dr
+		c0,c1=max(0,-dc),cols-max(0,dc)
+		valid=passable[r0:r1,c0:c1]&passable[r0+dr:r1+dr,c0+dc:c1+dc]
+		heads.append(index[r0:r1,c0:c1][valid])
+		tails.append(index[r0+dr:r1+dr,c0+dc:c1+dc][valid])
+		weights.append((half[r0:r1,c0:c1][valid]+half[r0+dr:r1+dr,c0+dc:c1+dc][valid])*math.hypot(dr*cell_height,dc*cell_width))
+	weight=numpy.concatenate(weights)
+	weight[weight==0]=numpy.finfo(numpy.float64).tiny
+	return scipy.sparse.csr_matrix((weight,(numpy.concatenate(heads),numpy.concatenate(tails))),shape=(rows*cols,rows*cols))
+
+#在_cost_graph_构建的图上做多源Dijkstra，返回(累积代价,前驱像元序号)一维数组
+#旧版scipy没有min_only参数时逐源计算后取最小值
+def _grid_dijkstra_(graph,sources):
+	if len(sources)==1:
+		return scipy.sparse.csgraph.dijkstra(graph,directed=False,indices=sources[0],return_predecessors=True)
+	try:
+		dist,pred,nearest=scipy.sparse.csgraph.dijkstra(graph,directed=False,indices=sources,return_predecessors=True,min_only=True)
+		return dist,pred
+	except TypeError:
+		dist,pred=scipy.sparse.csgraph.dijkstra(graph,directed=False,indices=sources,return_predecessors=True)
+		best=dist.argmin(axis=0)
+		cells=numpy.arange(dist.shape[1])
+		return dist[best,cells],pred[best,cells]
+
+#以sources为源在代价栅格cost上做8邻域最小累积代价计算，返回(累积代价,回溯方向)数组
+#cost中nan或负值为不可通行像元；相邻像元间代价为两像元代价均值乘以像元中心距离
+#未到达的像元累积代价为inf，回溯方向为-1；graph为_cost_graph_的结果，为None时现场构建
+def cost_distance(cost,sources,cell_width=1.0,cell_height=None,graph=None):
+	cost=numpy.asarray(cost,dtype=numpy.float64)
+	rows,cols=cost.shape
+	passable=(~numpy.isnan(cost))&(cost>=0)
+	sources=[r*cols+c for r,c in sources if passable[r,c]]
+	acc=numpy.full(rows*cols,numpy.inf)
+	back=numpy.full(rows*cols,-1,dtype=numpy.int8)
+	if len(sources)==0:
+		return acc.reshape(rows,cols),back.reshape(rows,cols)
+	if graph is None:
+		graph=_cost_graph_(cost,cell_width,cell_height)
+	acc,pred=_grid_dijkstra_(graph,sources)
+	#前驱相对当前像元的偏移换算为回溯方向编码
+	codes=numpy.full(9,-1,dtype=numpy.int8)
+	for code in range(1,9):
+		dr,dc=__BACKLINK_OFFSETS[code]
+		codes[(dr+1)*3+dc+1]=code
+	reached=numpy.nonzero(pred>=0)[0]
+	dr=pred[reached]//cols-reached//cols
+	dc=pred[reached]%cols-reached%cols
+	back[reached]=codes[(dr+1)*3+dc+1]
+	back[sources]=0
+	acc[sources]=0.0
+	return acc.reshape(rows,cols),back.reshape(rows,cols)
+
+#沿回溯方向从cell走回源，返回途经像元(行,列)列表，首个元素为cell；无法到达时返回None
+def cost_path(backlink,cell):
+	r,c=cell
+	if backlink[r,c]<0:
+		return None
+	path=[(r,c)]
+	while backlink[r,c]!=0:
+		dr,dc=__BACKLINK_OFFSETS[backlink[r,c]]
+		r,c=r+dr,c+dc
+		path.append((r,c))
+	return path
+
+class CostSurface:
+	"代价栅格、其8邻域图及按源像元缓存的累积代价面，同一栅格上多次求最小代价路径时不重复计算，缓存最多cache_size个、cache_bytes字节的代价面。\nCostSurface(cost_raster)或CostSurface(numpy数组,x_min,y_max,cell_width,cell_height)"
+	def __init__(self,cost_raster,x_min=0.0,y_max=0.0,cell_width=1.0,cell_height=None,cache_size=16,cache_bytes=256*1024*1024):
+		if type(cost_raster)==numpy.ndarray:
+			self.cost=cost_raster.astype(numpy.float64)
+			self.x_min=x_min
+			self.y_max=y_max
+			self.cell_width=cell_width
+			self.cell_height=cell_width if cell_height==None else cell_height
+		else:
+			raster=arcpy.Raster(cost_raster)
+			self.cost=arcpy.RasterToNumPyArray(raster).astype(numpy.float64)
+			if raster.noDataValue!=None:
+				self.cost[self.cost==raster.noDataValue]=numpy.nan
+			self.x_min=raster.extent.XMin
+			self.y_max=raster.extent.YMax
+			self.cell_width=raster.meanCellWidth
+			self.cell_height=raster.meanCellHeight
+		self.graph=None
+		self.cache=collections.OrderedDict()
+		self.cache_size=cache_size
+		self.cache_bytes=cache_bytes
+	def xy_to_cell(self,xy):
+		c=int(math.floor((xy[0]-self.x_min)/self.cell_width))
+		r=int(math.floor((self.y_max-xy[1])/self.cell_height))
+		rows,cols=self.cost.shape
+		if r<0 or r>=rows or c<0 or c>=cols:
+			return None
+		return (r,c)
+	def cell_to_xy(self,cell):
+		return (self.x_min+(cell[1]+0.5)*self.cell_width,self.y_max-(cell[0]+0.5)*self.cell_height)
+	def distance(self,sources):
+		"返回以sources(像元列表)为源的(累积代价,回溯方向)，结果按源缓存"
+		key=tuple(sorted(sources))
+		if key in self.cache:
+			res=self.cache.pop(key)
+		else:
+			if self.graph is None:
+				self.graph=_cost_graph_(self.cost,self.cell_width,self.cell_height)
+			res=cost_distance(self.cost,list(key),self.cell_width,self.cell_height,self.graph)
+		self.cache[key]=res
+		self.evict()
+		return res
+	def evict(self):
+		"淘汰最久未使用的代价面，直到不超过cache_size个和cache_bytes字节"
+		while len(self.cache)>self.cache_size or (len(self.cache)>0 and self.cache_nbytes()>self.cache_bytes):
+			self.cache.popitem(last=False)
+	def cache_nbytes(self):
+		return sum([acc.nbytes+back.nbytes for acc,back in self.cache.values()])
+	def nbytes(self):
+		"代价栅格、图和缓存占用的字节数"
+		res=self.cost.nbytes+self.cache_nbytes()
+		if self.graph is not None:
+			res+=self.graph.data.nbytes+self.graph.indices.nbytes+self.graph.indptr.nbytes
+		return res
+	def clear(self):
+		"释放缓存的代价面和8邻域图"
+		self.cache.clear()
+		self.graph=None
+	def path(self,source,target):
+		"返回从source像元到target像元的(累积代价,路径坐标列表)，无法到达时返回None"
+		acc,back=self.distance([source])
+		cells=cost_path(back,target)
+		if cells==None:
+			return None
+		cells.reverse()
+		return acc[target],[self.cell_to_xy(x) for x in cells]
+
+#同一代价栅格的CostSurface，按栅格路径和修改时间复用；总量超过__COST_SURFACE_BYTES时淘汰最久未使用的栅格
+__COST_SURFACES = collections.OrderedDict()
+__COST_SURFACE_BYTES = 512*1024*1024
+
+def __cost_surface(cost_raster):
+	if isinstance(cost_raster,CostSurface):
+		return cost_raster
+	path=arcpy.Describe(cost_raster).catalogPath
+	mtime=os.path.getmtime(path) if os.path.exists(path) else None
+	surface=__COST_SURFACES.pop(path,None)
+	if surface==None or surface[0]!=mtime:
+		surface=(mtime,CostSurface(cost_raster))
+	__COST_SURFACES[path]=surface
+	return surface[1]
+
+#按字节预算淘汰CostDistPath复用的代价栅格，keep为正在使用的栅格
+def __evict_cost_surfaces(keep=None):
+	while len(__COST_SURFACES)>0 and sum([x[1].nbytes() for x in __COST_SURFACES.values()])>__COST_SURFACE_BYTES:
+		path,surface=__COST_SURFACES.popitem(last=False)
+		if surface[1] is keep:
+			__COST_SURFACES[path]=surface
+			if len(__COST_SURFACES)==1:
+				break
+
+#释放CostDistPath复用的全部代价栅格；memory_budget不为None时同时修改字节预算
+def clear_cost_surfaces(memory_budget=None):
+	global __COST_SURFACE_BYTES
+	__COST_SURFACES.clear()
+	if memory_budget!=None:
+		__COST_SURFACE_BYTES=memory_budget
+
+#计算节点两两之间在代价栅格上的最小代价路径，输出边线字段为node_1、node_2、cost
+#cost_raster可以是栅格路径或CostSurface；id_field为None时node_1、node_2记录节点序号
+#max_cost不为None时只输出累积代价不超过max_cost的路径
+#CostDistPath("vills_prj","slp_pcs.tif","vills_cost_path",id_field="vid")
+def CostDistPath(nodes,cost_raster,out_edges,id_field=None,in_memory=True,max_cost=None):
+	surface=__cost_surface(cost_raster)
+	xy=__node_xy(nodes)
+	if id_field==None:
+		ids=range(len(xy))
+	else:
+		ids=[row[0] for row in arcpy.da.SearchCursor(nodes,[id_field])]
+	cells=[surface.xy_to_cell(x) for x in xy.tolist()]
 	
+	sr=arcpy.Describe(nodes).SpatialReference
+	fields=[("node_1","LONG"),("node_2","LONG"),("cost","DOUBLE")]
+	feature_class=__new_edge_dataset(out_edges,fields,sr,in_memory)
+	cursor=arcpy.da.InsertCursor(feature_class,["SHAPE@"]+[x[0] for x in fields])
+	for i in range(len(cells)):
+		if cells[i]==None:
+			continue
+		for j in range(i+1,len(cells)):
+			if cells[j]==None:
+				continue
+			res=surface.path(cells[i],cells[j])
+			if res==None or (max_cost!=None and res[0]>max_cost):
+				continue
+			arr=arcpy.Array([arcpy.Point(*x) for x in res[1]])
+			if len(arr)<2:
+				arr.append(arcpy.Point(*res[1][0]))
+			cursor.insertRow([arcpy.Polyline(arr,sr),ids[i],ids[j],float(res[0])])
+	del cursor
+	__evict_cost_surfaces(surface)
+	return feature_class
+
+
+#由(行,列,权重)构建CSR矩阵，重复边保留权重最小的一条；csgraph将0视为无边，零权重改为极小值
+def _min_csr_(rows,cols,weight,count):
+	order=numpy.lexsort((weight,cols,rows))
+	rows,cols,weight=rows[order],cols[order],weight[order]
+	first=numpy.ones(len(rows),dtype=bool)
+	first[1:]=(rows[1:]!=rows[:-1])|(cols[1:]!=cols[:-1])
+	rows,cols,weight=rows[first],cols[first],weight[first]
+	weight[weight==0]=numpy.finfo(numpy.float64).tiny
+	return scipy.sparse.csr_matrix((weight,(rows,cols)),shape=(count,count))
+
+class GeoNetwork:
+	"由边表(node_1,node_2,weight)构建的scipy.sparse CSR图，节点编号映射为0~n-1的序号，查询结果均为numpy数组。\nGeoNetwork(node_1,node_2,weight=None,directed=False,node_ids=None)，node_ids用于补充没有边的孤立节点"
+	def __init__(self,node_1,node_2,weight=None,directed=False,node_ids=None):
+		node_1=numpy.asarray(node_1)
+		node_2=numpy.asarray(node_2)
+		if weight is None:
+			weight=numpy.ones(len(node_1))
+		weight=numpy.asarray(weight,dtype=numpy.float64)
+		if node_ids is None:
+			self.ids=numpy.unique(numpy.concatenate([node_1,node_2]))
+		else:
+			self.ids=numpy.unique(numpy.concatenate([node_1,node_2,numpy.asarray(node_ids)]))
+		self.directed=directed
+		rows=numpy.searchsorted(self.ids,node_1)
+		cols=numpy.searchsorted(self.ids,node_2)
+		self.graph=_min_csr_(rows,cols,weight,len(self.ids))
+	def __len__(self):
+		return len(self.ids)
+	def index(self,node_ids):
+		"节点编号转换为序号"
+		node_ids=numpy.asarray(node_ids)
+		idx=numpy.searchsorted(self.ids,node_ids)
+		if numpy.any(idx>=len(self.ids)) or numpy.any(self.ids[numpy.minimum(idx,len(self.ids)-1)]!=node_ids):
+			raise Exception("找不到节点："+str(node_ids))
+		return idx
+	def shortest_paths(self,sources,return_predecessors=False):
+		"返回sources(节点编号或列表)到所有节点的最短路径长度，不可达为inf；return_predecessors为True时同时返回前驱节点序号(-9999为无)"
+		return scipy.sparse.csgraph.dijkstra(self.graph,directed=self.directed,indices=self.index(sources),return_predecessors=return_predecessors)
+	def all_pairs(self):
+		"返回n×n最短路径长度矩阵"
+		return scipy.sparse.csgraph.shortest_path(self.graph,directed=self.directed)
+	def k_nearest(self,k,sources=None,block_bytes=64*1024*1024):
+		"返回每个源节点沿网络最近的k个节点(编号数组,距离数组)，不足k个时编号为None、距离为inf"
+		if sources is None:
+			sources=numpy.arange(len(self.ids))
+		else:
+			sources=self.index(sources)
+		count=len(self.ids)
+		kk=min(k,count-1)
+		near_idx=numpy.zeros((len(sources),k),dtype=numpy.intp)
+		near_dist=numpy.full((len(sources),k),numpy.inf)
+		step=max(1,block_bytes//max(1,count*8))
+		for start in range(0,len(sources),step):
+			block=sources[start:start+step]
+			dist=scipy.sparse.csgraph.dijkstra(self.graph,directed=self.directed,indices=block)
+			dist[numpy.arange(len(block)),block]=numpy.inf
+			if kk<=0:
+				continue
+			part=numpy.argpartition(dist,kk-1,axis=1)[:,:kk]
+			rows=numpy.arange(len(block))[:,None]
+			part_dist=dist[rows,part]
+			order=numpy.argsort(part_dist,axis=1)
+			near_idx[start:start+len(block),:kk]=part[rows,order]
+			near_dist[start:start+len(block),:kk]=part_dist[rows,order]
+		near_ids=self.ids[near_idx].astype(object)
+		near_ids[numpy.isinf(near_dist)]=None
+		return near_ids,near_dist
+	def adjacency(self):
+		"返回用于遍历的CSR矩阵，无向图补全两个方向的边"
+		if self.directed:
+			return self.graph
+		coo=self.graph.tocoo()
+		rows=numpy.concatenate([coo.row,coo.col])
+		cols=numpy.concatenate([coo.col,coo.row])
+		return _min_csr_(rows,cols,numpy.concatenate([coo.data,coo.data]),len(self.ids))
+	def components(self):
+		"返回(连通分量数,各节点所属分量序号)，有向图按弱连通计算"
+		return scipy.sparse.csgraph.connected_components(self.graph,directed=self.directed,connection="weak")
+
+#读取网络构建工具输出的边线要素类或EDGES.NPZ文件，返回GeoNetwork
+#weight_field为None时依次使用weight、length、cost字段，都没有时权重为1
+#g = load_network(GenGeoNetworkByLength("vills_prj","vills_300",300))
+#dist = g.shortest_paths(0)
+#node_ids用于补充没有边的孤立节点
+def load_network(edge_dataset,weight_field=None,directed=False,node_fields=["node_1","node_2"],node_ids=None):
+	npz_columns=None
+	if (type(edge_dataset)==str or type(edge_dataset)==unicode) and edge_dataset.lower().endswith(".npz"):
+		npz_columns=read_edges(edge_dataset)[4]
+		field_names=list(npz_columns.keys())
+	else:
+		field_names=[x.name for x in arcpy.Describe(edge_dataset).fields]
+	if weight_field==None:
+		for name in ["weight","length","cost"]:
+			if name in field_names:
+				weight_field=name
+				break
+	if npz_columns!=None:
+		weight=npz_columns[weight_field] if weight_field!=None else None
+		return GeoNetwork(npz_columns[node_fields[0]],npz_columns[node_fields[1]],weight,directed,node_ids)
+	fields=list(node_fields)
+	if weight_field!=None:
+		fields.append(weight_field)
+	node_1,node_2,weight=[],[],[]
+	for row in arcpy.da.SearchCursor(edge_dataset,fields):
+		node_1.append(row[0])
+		node_2.append(row[1])
+		if weight_field!=None:
+			weight.append(row[2])
+	return GeoNetwork(node_1,node_2,weight if weight_field!=None else None,directed,node_ids)
+
+
+#Brandes算法，计算sources中各源节点对中介中心性的贡献
+#csr为(indptr,indices,data)列表，weighted为False时按边数计算最短路径
+def __brandes_worker(args):
+	indptr,indices,data,sources,weighted=args
+	cb=[0.0]*(len(indptr)-1)
+	for s in sources:
+		stack=[]
+		preds={s:[]}
+		sigma={s:1.0}
+		if weighted:
+			dist={}
+			seen={s:0.0}
+			heap=[(0.0,s,s)]
+			while heap:
+				d,pred,v=heapq.heappop(heap)
+				if v in dist:
+					continue
+				if v!=s:
+					sigma[v]+=sigma[pred]
+				dist[v]=d
+				stack.append(v)
+				for k in range(indptr[v],indptr[v+1]):
+					w=indices[k]
+					if w in dist:
+						continue
+					nd=d+data[k]
+					if not w in seen or nd<seen[w]:
+						seen[w]=nd
+						heapq.heappush(heap,(nd,v,w))
+						sigma[w]=0.0
+						preds[w]=[v]
+					elif nd==seen[w]:
+						#等长路径
+						sigma[w]+=sigma[v]
+						preds[w].append(v)
+		else:
+			dist={s:0}
+			queue=collections.deque([s])
+			while queue:
+				v=queue.popleft()
+				stack.append(v)
+				for k in range(indptr[v],indptr[v+1]):
+					w=indices[k]
+					if not w in dist:
+						dist[w]=dist[v]+1
+						sigma[w]=0.0
+						preds[w]=[]
+						queue.append(w)
+					if dist[w]==dist[v]+1:
+						sigma[w]+=sigma[v]
+						preds[w].append(v)
+		delta=dict.fromkeys(stack,0.0)
+		while stack:
+			w=stack.pop()
+			coeff=(1.0+delta[w])/sigma[w]
+			for v in preds[w]:
+				delta[v]+=sigma[v]*coeff
+			if w!=s:
+				cb[w]+=delta[w]
+	return cb
+
+#在ArcMap中sys.executable不是python.exe，需要指定子进程的解释器
+def __process_pool(processes):
+	if not os.path.basename(sys.executable).lower().startswith("python"):
+		executable=os.path.join(sys.exec_prefix,"python.exe")
+		if os.path.exists(executable):
+			multiprocessing.set_executable(executable)
+	return multiprocessing.Pool(processes)
+
+#计算GeoNetwork的度、接近中心性和中介中心性，返回与network.ids对应的三个numpy数组
+#weighted为False时按边数计算路径长度；接近中心性按可达节点比例修正(Wasserman-Faust)
+#中介中心性用Brandes算法，源节点分块后分配到processes个进程中计算再合并，processes为1时在当前进程计算
+#normalized为True时中介中心性除以(n-1)(n-2)，无向图再乘以2
+def network_centrality(network,weighted=True,processes=None,normalized=True,block_bytes=64*1024*1024):
+	graph=network.adjacency()
+	count=len(network.ids)
+	#度
+	if network.directed:
+		degree=numpy.diff(graph.indptr)+numpy.diff(graph.tocsc().indptr)
+	else:
+		degree=numpy.diff(graph.indptr)
+	#接近中心性
+	closeness=numpy.zeros(count)
+	step=max(1,block_bytes//max(1,count*8))
+	for start in range(0,count,step):
+		block=numpy.arange(start,min(start+step,count))
+		dist=scipy.sparse.csgraph.dijkstra(graph,directed=True,indices=block,unweighted=not weighted)
+		reach=numpy.isfinite(dist)
+		total=numpy.where(reach,dist,0).sum(axis=1)
+		reached=reach.sum(axis=1)-1
+		valid=(total>0)&(count>1)
+		closeness[block[valid]]=reached[valid]/total[valid]*reached[valid]/float(count-1)
+	#中介中心性
+	indptr=graph.indptr.tolist()
+	indices=graph.indices.tolist()
+	data=graph.data.tolist()
+	if processes==None:
+		processes=multiprocessing.cpu_count()
+	chunks=[range(start,count,processes*4) for start in range(min(count,processes*4))]
+	tasks=[(indptr,indices,data,chunk,weighted) for chunk in chunks]
+	if processes>1 and count>1:
+		pool=__process_pool(processes)
+		try:
+			results=pool.map(__brandes_worker,tasks)
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		results=[__brandes_worker(task) for task in tasks]
+	betweenness=numpy.zeros(count)
+	for cb in results:
+		betweenness+=numpy.array(cb)
+	if not network.directed:
+		betweenness/=2.0
+	if normalized and count>2:
+		scale=1.0/((count-1)*(count-2))
+		if not network.directed:
+			scale*=2.0
+		betweenness*=scale
+	return degree,closeness,betweenness
+
+#计算网络中心性并写回节点要素，字段不存在时自动创建，字段名为None时不输出该指标
+#id_field为None时边线的node_1、node_2为节点要素中的序号(GenGeoNetworkByLength等的输出)，否则为id_field的值
+#NetworkCentrality("vills_prj",GenGeoNetworkByLength("vills_prj","vills_300",300,directed=False),processes=16)
+def NetworkCentrality(nodes,edge_dataset,id_field=None,degree_field="degree",closeness_field="closeness",betweenness_field="betweenness",weight_field=None,weighted=True,directed=False,processes=None,normalized=True):
+	if id_field==None:
+		node_ids=numpy.arange(int(arcpy.management.GetCount(nodes)[0]))
+	else:
+		node_ids=[row[0] for row in arcpy.da.SearchCursor(nodes,[id_field])]
+	network=load_network(edge_dataset,weight_field,directed,node_ids=node_ids)
+	values=network_centrality(network,weighted,processes,normalized)
 	
+	field_names=[x.name for x in arcpy.Describe(nodes).fields]
+	out_fields=[]
+	out_values=[]
+	for field,field_type,value in zip([degree_field,closeness_field,betweenness_field],["LONG","DOUBLE","DOUBLE"],values):
+		if field==None:
+			continue
+		if not field in field_names:
+			arcpy.management.AddField(nodes,field,field_type)
+		out_fields.append(field)
+		out_values.append(value[network.index(node_ids)].tolist())
+	if out_fields==[]:
+		return
+	cursor=arcpy.da.UpdateCursor(nodes,out_fields)
+	index=0
+	for row in cursor:
+		cursor.updateRow([x[index] for x in out_values])
+		index+=1
+	del cursor
+
 #node_offset("PeakIndex",-0.0060,-0.0005)
 def node_offset(node_dataset,x_offset,y_offset):
 	with arcpy.da.UpdateCursor(node_dataset, ["SHAPE@"]) as cursor:
@@ -311,77 +1209,121 @@ def create_vectors(point_dataset,line_dataset,origin,field,length=None,in_memory
 		cursor.insertRow([line,value])
 
 
-#计算点坐标分类排斥性
-def calc_exclusiveness(point_dataset,field,func=lambda x:x):
-	field_type=__field_type(point_dataset,field)
-	points_rec=[]
-	for row in arcpy.da.SearchCursor(point_dataset,["SHAPE@",field]):
-		points_rec.append([row[0],func(row[1])])
-	del row
-	class_dict = {}
-	for point_rec in points_rec:
-		point = point_rec[0].firstPoint
-		value = point_rec[1]
-		if class_dict.has_key(value):
-			class_dict[value].append(point)
-		else:
-			class_dict[value]=[point]
-	# print class_dict.keys()
-	inner_distance = 0.0
-	outer_distance = 0.0
-	inner_count = 0
-	outer_count = 0
-	for key in class_dict.keys():
-		count = len(class_dict[key])
-		for i in range(count):
-			for j in range(i):
-				p1   = class_dict[key][i]
-				p2   = class_dict[key][j]
-				line = arcpy.Polyline(arcpy.Array([p1,p2]))
-				inner_distance+=line.length
-				inner_count+=1
-	key_count = len(class_dict.keys())
-	key_list  = class_dict.keys()[:]
-	for i in range(key_count):
-		for j in range(i):
-			i_count = len(class_dict[key_list[i]])
-			j_count = len(class_dict[key_list[j]])
-			for ii in range(i_count):
-				for jj in range(j_count):
-					p1   = class_dict[key_list[i]][ii]
-					p2   = class_dict[key_list[j]][jj]
-					line = arcpy.Polyline(arcpy.Array([p1,p2]))
-					outer_distance+=line.length
-					outer_count+=1
+#分块计算xy_1与xy_2之间全部点对距离之和，每块距离矩阵不超过block_bytes字节
+def __distance_sum(xy_1,xy_2,block_bytes=64*1024*1024):
+	total = 0.0
+	block_size = max(1,block_bytes//max(1,len(xy_2)*8))
+	for start in range(0,len(xy_1),block_size):
+		total += scipy.spatial.distance.cdist(xy_1[start:start+block_size],xy_2).sum()
+	return total
+
+#计算点坐标分类排斥性，返回(类内平均距离,类间平均距离,类间/类内)
+#mode="EXACT"按类分块精确计算；mode="SAMPLE"随机抽样估计，抽样直到比值置信区间的相对半宽不超过precision(或达到max_samples)，
+#此时额外返回比值的置信区间(下限,上限)；EXACT模式按block_bytes限制每块距离矩阵的内存
+def calc_exclusiveness(point_dataset,field,func=lambda x:x,mode="EXACT",precision=0.01,confidence=0.95,seed=None,max_samples=10000000,block_bytes=64*1024*1024):
+	xy=[]
+	classes=[]
+	for row in arcpy.da.SearchCursor(point_dataset,["SHAPE@XY",field]):
+		xy.append(row[0])
+		classes.append(func(row[1]))
+	xy=numpy.array(xy,dtype=numpy.float64).reshape(-1,2)
+	class_codes={}
+	codes=numpy.array([class_codes.setdefault(x,len(class_codes)) for x in classes],dtype=numpy.intp)
+	#按类排序，members[offsets[k]:offsets[k+1]]为第k类的点
+	members=numpy.argsort(codes,kind="mergesort")
+	sizes=numpy.bincount(codes,minlength=len(class_codes)).astype(numpy.float64)
+	offsets=numpy.concatenate([[0],numpy.cumsum(sizes).astype(numpy.intp)])
+	cnt=float(len(xy))
+	inner_count=(sizes*(sizes-1)/2).sum()
+	outer_count=cnt*(cnt-1)/2-inner_count
 	if inner_count*outer_count == 0:
 		return None
-	aver_inner = inner_distance/inner_count
-	aver_outer = outer_distance/outer_count
-	return aver_inner, aver_outer, aver_outer/aver_inner
+	mode=mode.upper()
+	if mode=="EXACT":
+		inner_distance=0.0
+		for k in range(len(sizes)):
+			pts=xy[members[offsets[k]:offsets[k+1]]]
+			inner_distance+=__distance_sum(pts,pts,block_bytes)/2
+		outer_distance=__distance_sum(xy,xy,block_bytes)/2-inner_distance
+		aver_inner = inner_distance/inner_count
+		aver_outer = outer_distance/outer_count
+		return aver_inner, aver_outer, aver_outer/aver_inner
+	elif mode=="SAMPLE":
+		rng=numpy.random.RandomState(seed)
+		z=scipy.stats.norm.ppf(0.5+confidence/2.0)
+		pair_weights=sizes*(sizes-1)/2/inner_count
+		inner_samples,outer_samples=[],[]
+		batch=10000
+		while True:
+			#类内点对：按点对数量比例抽取类别，再在类内抽取两个不同的点
+			k=rng.choice(len(sizes),batch,p=pair_weights)
+			m=sizes[k]
+			a=numpy.floor(rng.random_sample(batch)*m).astype(numpy.intp)
+			b=numpy.floor(rng.random_sample(batch)*(m-1)).astype(numpy.intp)
+			b+=b>=a
+			ia,ib=members[offsets[k]+a],members[offsets[k]+b]
+			inner_samples.append(numpy.hypot(xy[ia,0]-xy[ib,0],xy[ia,1]-xy[ib,1]))
+			#类间点对：均匀抽取点对，舍弃同类点对
+			ia=rng.randint(0,len(xy),batch)
+			ib=rng.randint(0,len(xy),batch)
+			keep=codes[ia]!=codes[ib]
+			ia,ib=ia[keep],ib[keep]
+			outer_samples.append(numpy.hypot(xy[ia,0]-xy[ib,0],xy[ia,1]-xy[ib,1]))
+			inner=numpy.concatenate(inner_samples)
+			outer=numpy.concatenate(outer_samples)
+			if len(outer)<2:
+				continue
+			aver_inner,aver_outer=inner.mean(),outer.mean()
+			ratio=aver_outer/aver_inner
+			#比值的标准误按delta方法估计
+			se=ratio*numpy.sqrt(inner.var(ddof=1)/len(inner)/aver_inner**2+outer.var(ddof=1)/len(outer)/aver_outer**2)
+			if z*se<=precision*ratio or len(inner)+len(outer)>=max_samples:
+				break
+			batch=min(batch*2,1000000)
+		return aver_inner, aver_outer, ratio, (ratio-z*se, ratio+z*se)
+	else:
+		raise Exception("无效的计算方式："+mode)
 
 
-#计算点要素空间距离并返回二维数组
-def calc_geodistance_point(point_dataset):
-	points = []
-	for row in arcpy.da.SearchCursor(point_dataset,["SHAPE@"]):
-		points.append(row[0])
-	del row
-	res = []
-	cnt = len(points)
-	#矩阵左下部分赋值
-	for i in range(cnt):
-		row_res = []
-		for j in range(i):
-			row_res.append(points[i].distanceTo(points[j]))
-		res.append(row_res)
-	#矩阵对角线赋值
-	for i in range(cnt):
-		res[i].append(0.0)
-	#矩阵右上部分赋值
-	for i in range(cnt):
-		for j in range(i+1,cnt):
-			res[i].append(res[j][i])
-	return res
+#新建结果数组，memmap为True时保存在磁盘文件中，memmap_path为None时使用关闭后由系统回收的临时文件
+def __new_result_array(shape,dtype,memmap=False,memmap_path=None):
+	if not memmap:
+		return numpy.empty(shape,dtype=dtype)
+	if memmap_path==None:
+		memmap_path=tempfile.TemporaryFile()
+	return numpy.memmap(memmap_path,dtype=dtype,mode="w+",shape=shape)
+
+#计算点要素空间距离，返回numpy数组
+#form="SQUARE"返回n×n矩阵，"CONDENSED"返回与scipy.spatial.distance.pdist相同格式的压缩向量
+#dtype可以设为numpy.float32以减半内存
+#memmap为True时结果存放在磁盘上的numpy.memmap中(memmap_path为None时使用临时文件)，为None时节点数超过memmap_threshold自动启用
+#按行分块计算，每块float64中间结果不超过block_bytes字节
+def calc_geodistance_point(point_dataset,form="SQUARE",dtype=numpy.float64,memmap=None,memmap_path=None,memmap_threshold=30000,block_bytes=64*1024*1024):
+	xy = __node_xy(point_dataset)
+	cnt = len(xy)
+	if memmap==None:
+		memmap = cnt>memmap_threshold
+	block_size = max(1,block_bytes//max(1,cnt*8))
+	form = form.upper()
+	if form=="SQUARE":
+		res = __new_result_array((cnt,cnt),dtype,memmap,memmap_path)
+		for start in range(0,cnt,block_size):
+			stop = min(start+block_size,cnt)
+			res[start:stop] = scipy.spatial.distance.cdist(xy[start:stop],xy)
+		return res
+	elif form=="CONDENSED":
+		if not memmap and dtype==numpy.float64:
+			return scipy.spatial.distance.pdist(xy)
+		res = __new_result_array((cnt*(cnt-1)//2,),dtype,memmap,memmap_path)
+		for start in range(0,cnt,block_size):
+			stop = min(start+block_size,cnt)
+			block = scipy.spatial.distance.cdist(xy[start:stop],xy)
+			for i in range(start,stop):
+				offset = i*(2*cnt-i-1)//2
+				res[offset:offset+cnt-i-1] = block[i-start,i+1:]
+		return res
+	else:
+		raise Exception("无效的结果格式："+form)
 
 
 #计算点要素属性距离并返回二维数组
@@ -405,5 +1347,73 @@ def calc_fielddistance_point(point_dataset, field_name, type_exchange=lambda x:f
 	return res
 
 
+#每个字节中1的个数
+__POPCOUNT_TABLE = numpy.array([bin(x).count("1") for x in range(256)],dtype=numpy.uint8)
 
+#统计uint64数组最后一维上的1的个数
+def __popcount(words):
+	bitwise_count = getattr(numpy,"bitwise_count",None)
+	if bitwise_count!=None:
+		return bitwise_count(words).sum(axis=-1,dtype=numpy.int32)
+	bytes_view = words.view(numpy.uint8).reshape(words.shape[:-1]+(words.shape[-1]*8,))
+	return __POPCOUNT_TABLE[bytes_view].sum(axis=-1,dtype=numpy.int32)
+
+#将集合列表编码为按位压缩的uint64数组，每行对应一个集合
+def __encode_bitsets(sets):
+	vocab = {}
+	for item in sets:
+		for element in item:
+			vocab.setdefault(element,len(vocab))
+	words = max(1,(len(vocab)+63)//64)
+	bits = numpy.zeros((len(sets),words*64),dtype=bool)
+	for row,item in enumerate(sets):
+		bits[row,[vocab[x] for x in item]] = True
+	packed = numpy.packbits(bits,axis=1)
+	return packed.view(numpy.uint64).reshape(len(sets),words)
+
+#读取集合字段并按位编码，返回(编码数组,各集合大小,每块行数)，每块交集计算的中间结果不超过block_bytes字节
+def __jaccard_bitsets(point_dataset,field_name,type_exchange,block_bytes):
+	values = []
+	for row in arcpy.da.SearchCursor(point_dataset,[field_name]):
+		values.append(type_exchange(row[0]))
+	bits = __encode_bitsets(values)
+	step = max(1,block_bytes//max(1,len(values)*bits.shape[1]*8))
+	return bits, __popcount(bits), step
+
+#计算第start至stop行集合与全部集合的Jaccard相似度
+def __jaccard_block(bits,sizes,start,stop):
+	inter = __popcount(bits[start:stop,None,:] & bits[None,:,:])
+	union = sizes[start:stop,None]+sizes[None,:]-inter
+	return numpy.where(union>0,inter/numpy.maximum(union,1).astype(numpy.float64),0.0)
+
+#计算点要素集合字段的Jaccard相似度并返回n×n数组，与calc_fielddistance_point(..., relationship=集合Jaccard)结果一致
+#type_exchange将字段值转换为集合；两个集合均为空时相似度为0
+#集合按位编码后分块计算交集大小，threads大于1时各块分配到线程池中计算
+#calc_jaccard_point("villageGene","gene",lambda x:set(x.split("-"))-set([""]),numpy.float32,threads=8)
+def calc_jaccard_point(point_dataset, field_name, type_exchange=lambda x:set(x), dtype=numpy.float64, threads=1, block_bytes=64*1024*1024):
+	bits,sizes,step = __jaccard_bitsets(point_dataset,field_name,type_exchange,block_bytes)
+	cnt = len(bits)
+	res = numpy.empty((cnt,cnt),dtype=dtype)
+	def calc_block(start):
+		stop = min(start+step,cnt)
+		res[start:stop] = __jaccard_block(bits,sizes,start,stop)
+	starts = range(0,cnt,step)
+	if threads>1:
+		pool = multiprocessing.pool.ThreadPool(threads)
+		try:
+			pool.map(calc_block,starts)
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		for start in starts:
+			calc_block(start)
+	return res
 
+#按行分块返回集合字段Jaccard相似度，每次产生(start,stop,block)，block为第start至stop行的float64数组，用于不保存n×n结果的逐块计算
+#for start,stop,block in iter_jaccard_point("villageGene","gene",lambda x:set(x.split("-"))-set([""])): ...
+def iter_jaccard_point(point_dataset, field_name, type_exchange=lambda x:set(x), block_bytes=64*1024*1024):
+	bits,sizes,step = __jaccard_bitsets(point_dataset,field_name,type_exchange,block_bytes)
+	for start in range(0,len(bits),step):
+		stop = min(start+step,len(bits))
+		yield start, stop, __jaccard_block(bits,sizes,start,stop)
@@ -36,15 +36,28 @@ def _similarity_(v1,v2):
 # relation = S
 # result = D
 
+#D在calc_geodistance_point返回的数组(节点多于memmap_threshold时为磁盘上的memmap)上按行分块原地计算，S由iter_jaccard_point逐块生成，不保存n×n的S
+#dtype为None时节点不多于memmap_threshold用float64，否则用float32以减半结果大小，float32结果与float64有约1e-7的相对误差
+def _comprehensive_relationship_(points, gene_field, dist_base, phi, dtype=None, memmap_threshold=30000):
+	if dtype==None:
+		count = int(arcpy.management.GetCount(points)[0])
+		dtype = numpy.float64 if count<=memmap_threshold else numpy.float32
+	result = net.calc_geodistance_point(points, dtype=dtype, memmap_threshold=memmap_threshold)
+	factor = result.dtype.type(math.log(10)/-dist_base)
+	for start,stop,relation in net.iter_jaccard_point(points, gene_field, _decode_LSBI_):
+		block = result[start:stop]
+		block *= factor
+		numpy.exp(block, out=block)
+		block *= result.dtype.type(phi)
+		relation *= 1-phi
+		block += relation
+	return result
+
 def village_comprehensive_relationship(points, gene_field, out_csv, dist_base, phi):
-	distance = net.calc_geodistance_point(points)
-	func = lambda d:math.exp(math.log(10)*d/-dist_base)
-	dist_std = [[func(cell) for cell in row] for row in distance]
-	relation = net.calc_fielddistance_point(points, gene_field, _decode_LSBI_, _similarity_)
-	result = phi*numpy.array(dist_std) + (1-phi)*numpy.array(relation)
+	result = _comprehensive_relationship_(points, gene_field, dist_base, phi)
 	f = open(out_csv,"w")
-	for row in result.tolist():
-		for cell in row:
+	for row in result:
+		for cell in row.tolist():
 			f.write(str(cell)+",")
 		f.write("\n")
 	f.close()
@@ -53,11 +66,7 @@ def hca_warning_func(x):
 	print(x)
 
 def village_comph_hca_quality(points, gene_field, dist_base, phi, ngroup_list, out_fig, warning_func=hca_warning_func):
-	distance = net.calc_geodistance_point(points)
-	func = lambda d:math.exp(math.log(10)*d/-dist_base)
-	dist_std = [[func(cell) for cell in row] for row in distance]
-	relation = net.calc_fielddistance_point(points, gene_field, _decode_LSBI_, _similarity_)
-	result = phi*numpy.array(dist_std) + (1-phi)*numpy.array(relation)
+	result = _comprehensive_relationship_(points, gene_field, dist_base, phi)
 	hca = hier.linkage(result, "ward")
 	count = len(hca)+1
 	pinf = float('+Inf')
@@ -119,11 +128,7 @@ def village_comph_hca_quality(points, gene_field, dist_base, phi, ngroup_list, o
 
 # out_fields = [(ngroup, out_field), ...]
 def village_comprehensive_hca(points, gene_field, out_fig, dist_base, phi, label_field=None, out_fields=None, warning_func=hca_warning_func, hca_method='ward', hca_metric='euclidean'):
-	distance = net.calc_geodistance_point(points)
-	func = lambda d:math.exp(math.log(10)*d/-dist_base)
-	dist_std = [[func(cell) for cell in row] for row in distance]
-	relation = net.calc_fielddistance_point(points, gene_field, _decode_LSBI_, _similarity_)
-	result = phi*numpy.array(dist_std) + (1-phi)*numpy.array(relation)
+	result = _comprehensive_relationship_(points, gene_field, dist_base, phi)
 	hca = hier.linkage(result, hca_method, hca_metric)
 	count = len(hca)+1
 	if label_field == None:
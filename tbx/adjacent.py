@@ -12,13 +12,15 @@ id_field=arcpy.GetParameterAsText(1)
 # fields=arcpy.ListFields(nodes)
 # fields.sort(key=lambda x:x.name==id_field,reverse=True)
 adjacent_matrix=arcpy.GetParameterAsText(2)
-max_dist=arcpy.GetParameterAsText(3)
+max_dist_str=arcpy.GetParameterAsText(3)
+try:
+	max_dist=float(max_dist_str)
+except:
+	max_dist=0
 criterion_str=arcpy.GetParameterAsText(4)
 if criterion_str=="" or criterion_str=="#":
-	# if fields[0].type.upper()=="STRING":
-		# criterion=lambda x,y:x==y
-	# else:
-		criterion=lambda x,y:int(x)==y
+	# 节点ID等于矩阵序号，由Adjacent2GeoNetwork按哈希索引匹配
+	criterion=None
 else:
 	criterion=eval(criterion_str)
 output_edges=arcpy.GetParameterAsText(5)
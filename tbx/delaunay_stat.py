@@ -18,4 +18,6 @@ value_field      = arcpy.GetParameterAsText(5)
 if not stat_field in [x.name for x in arcpy.Describe(delaunay_dataset).fields]:
 	arcpy.management.AddField(delaunay_dataset,stat_field,"SHORT")
 class_dict = src.attr.FieldDicter(node_dataset,key_field,value_field)
+if vertices_field in ["vert_1","vert_2","vert_3"]:
+	vertices_field = ["vert_1","vert_2","vert_3"]
 src.net.Delaunay_stat(delaunay_dataset,vertices_field,stat_field,class_dict)
@@ -7,7 +7,6 @@ sys.path.append(rp)
 import arcpy
 import src
 import src.attr as aattr
-import scipy.stats # 如果没有安装scipy，则需要python.exe -m pip install scipy 
 
 dataset     = arcpy.GetParameterAsText(0)
 field_name  = arcpy.GetParameterAsText(1)
@@ -24,8 +23,8 @@ except:
 	scale = 1
 
 if ppf_mode=='Normal':
-	aattr.random_field_values(dataset, field_name, rand_value_func=lambda x:scipy.stats.norm.ppf(x, loc=mean, scale=scale))
+	aattr.random_field_values(dataset, field_name, distribution="NORMAL", loc=mean, scale=scale)
 elif ppf_mode=='Uniform':
-	aattr.random_field_values(dataset, field_name, rand_value_func=lambda x:((x-mean)*2-1)*scale)
+	aattr.random_field_values(dataset, field_name, distribution="UNIFORM", loc=mean, scale=scale)
 else:
 	arcpy.AddError(u"无效的分布函数选项")
\ No newline at end of file